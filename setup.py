@@ -18,6 +18,7 @@ setuptools.setup(
         "Operating System :: OS Independent",
     ],
     packages=["smoot"],
+    package_data={"smoot": ["benchmark_baseline.json"]},
     python_requires=">=3.6",
     install_requires=["smt", "pymoo"],
 )
@@ -1,5 +1,10 @@
 from .smoot import MOO
 from .zdt import ZDT
+from .dtlz import DTLZ
+from .checkpoint import read_checkpoint
+from .cache import CachedFunction
+from .store import ResultsStore
+from .instrumentation import Instrumentation
 from .utils import (
     write_results,
     read_results,
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+Performance benchmark of MOO on the ZDT problems : wall time of each phase,
+peak memory and number of surrogate predictions, compared to a baseline.
+
+python -m smoot.benchmark --quick --output results.json
+
+compares by default the results to BASELINE, the results of QUICK_GRID on the
+machine of the last update of the file : it must be written again with
+--output when the reference machine changes.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+import tracemalloc
+
+from smoot.smoot import MOO
+from smoot.zdt import ZDT
+from smoot.instrumentation import Instrumentation
+
+BASELINE = os.path.join(os.path.dirname(__file__), "benchmark_baseline.json")
+
+GRID = {
+    "type": [1, 2, 3, 4, 5],
+    "ndim": [2, 5],
+    "n_start": [10],
+    "n_iter": [5],
+    "criterion": ["PI", "EHVI"],
+    "surrogate": ["KRG", "KPLS"],
+}
+QUICK_GRID = {
+    "type": [1, 2],
+    "ndim": [2],
+    "n_start": [10],
+    "n_iter": [2],
+    "criterion": ["PI"],
+    "surrogate": ["KRG"],
+}
+# measured phases : name of their Instrumentation events
+PHASES = {
+    "doe": "doe",
+    "training": "modelize",
+    "acquisition": "acquisition",
+    "evaluation": "evaluation",
+    "final": "final",
+}
+# many variables and a large doe, so that the models and the criteria
+# cost much more than the evaluations of the test function
+HIGH_DIM_GRID = {
+    "type": [1, 4],
+    "ndim": [30],
+    "n_start": [100],
+    "n_iter": [5],
+    "criterion": ["PI"],
+    "surrogate": ["KPLS"],
+}
+CASE_KEYS = ["type", "ndim", "n_start", "n_iter", "criterion", "surrogate"]
+METRICS = [
+    "time_total",
+    "time_doe",
+    "time_training",
+    "time_acquisition",
+    "time_evaluation",
+    "time_final",
+    "peak_memory",
+    "n_predictions",
+]
+
+
+def run_case(
+    type=1,
+    ndim=2,
+    n_start=10,
+    n_iter=5,
+    criterion="PI",
+    surrogate="KRG",
+    random_state=0,
+    memory=True,
+    **options
+):
+    """
+    One run of MOO.optimize on a ZDT problem.
+
+    Parameters
+    ----------
+    type, ndim : int
+        ZDT problem.
+    n_start, n_iter, criterion, surrogate, random_state, **options :
+        MOO options. pop_size and n_gen are 20 by default.
+    memory : bool, optional
+        True to measure the peak memory, during a second run as tracemalloc
+        slows the run down. The default is True.
+
+    Returns
+    -------
+    dictionnary
+        the case and its METRICS, times in seconds and memory in bytes,
+        or the case and its "error".
+    """
+    case = {
+        "type": type,
+        "ndim": ndim,
+        "n_start": n_start,
+        "n_iter": n_iter,
+        "criterion": criterion,
+        "surrogate": surrogate,
+    }
+    options.setdefault("pop_size", 20)
+    options.setdefault("n_gen", 20)
+    options.update(n_start=n_start, n_iter=n_iter, criterion=criterion)
+    options.update(surrogate=surrogate, random_state=random_state)
+    try:
+        case.update(_run(ZDT(type=type, ndim=ndim), options))
+        if memory:  # apart, tracemalloc slowing the run down
+            tracemalloc.start()
+            try:
+                _run(ZDT(type=type, ndim=ndim), options)
+                case["peak_memory"] = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    except Exception as e:
+        case["error"] = repr(e)
+    return case
+
+
+def _run(fun, options):
+    """
+    Run of MOO.optimize on fun measured with an Instrumentation
+    """
+    instrumentation = Instrumentation()
+    mo = MOO(xlimits=fun.xlimits, instrumentation=instrumentation, **options)
+    start = time.perf_counter()
+    mo.optimize(fun)
+    res = {"time_total": time.perf_counter() - start}
+    summary = instrumentation.summary()
+    for phase, name in PHASES.items():
+        res["time_" + phase] = summary.get(name, {}).get("time", 0.0)
+    res["peak_memory"] = None
+    res["n_predictions"] = summary.get("prediction", {}).get("count", 0)
+    return res
+
+
+def run_benchmark(grid=None, path=None, verbose=True, **options):
+    """
+    Runs all the cases of the grid.
+
+    Parameters
+    ----------
+    grid : dictionnary, optional
+        values of each key of CASE_KEYS. The default is GRID.
+    path : str, optional
+        json file where the results are written. The default is None.
+    verbose : bool, optional
+        True to print the results. The default is True.
+    **options :
+        see run_case.
+
+    Returns
+    -------
+    list of dictionnary
+        results of run_case.
+    """
+    grid = dict(GRID, **(grid or {}))
+    results = []
+    for values in itertools.product(*[grid[key] for key in CASE_KEYS]):
+        case = dict(zip(CASE_KEYS, values))
+        results.append(run_case(**case, **options))
+        if verbose:
+            print(_format(results[-1]))
+    if path is not None:
+        with open(path, "w") as fichier:
+            json.dump(results, fichier, indent=1)
+    return results
+
+
+def compare(results, baseline, rtol=0.25, atol=0.05):
+    """
+    Compares results to a baseline, case by case.
+
+    Parameters
+    ----------
+    results, baseline : list of dictionnary or str
+        results of run_benchmark, or json files.
+    rtol : float, optional
+        relative increase of a metric considered as a regression.
+        The default is 0.25.
+    atol : float, optional
+        increase of a time, in seconds, under which it is not considered
+        as a regression. The default is 0.05.
+
+    Returns
+    -------
+    list of dictionnary
+        regressions : the case, the "metric", its "baseline" and "new"
+        values and their "ratio".
+    """
+    results, baseline = _load(results), _load(baseline)
+    reference = {_key(res): res for res in baseline}
+    regressions = []
+    for res in results:
+        base = reference.get(_key(res))
+        if base is None or "error" in res or "error" in base:
+            continue
+        for metric in METRICS:
+            new, old = res.get(metric), base.get(metric)
+            if new is None or old is None:
+                continue
+            if new > old * (1 + rtol) and not (
+                metric.startswith("time") and new - old < atol
+            ):
+                regression = {key: res[key] for key in CASE_KEYS}
+                regression.update(
+                    {
+                        "metric": metric,
+                        "baseline": old,
+                        "new": new,
+                        "ratio": new / old if old > 0 else float("inf"),
+                    }
+                )
+                regressions.append(regression)
+    return regressions
+
+
+def _load(results):
+    if isinstance(results, str):
+        with open(results) as fichier:
+            return json.load(fichier)
+    return results
+
+
+def _key(res):
+    return tuple(res[key] for key in CASE_KEYS)
+
+
+def _format(res):
+    case = " ".join(str(res[key]) for key in CASE_KEYS)
+    if "error" in res:
+        return case + " error " + res["error"]
+    return case + " " + " ".join(
+        "%s=%.3g" % (metric, res[metric])
+        for metric in METRICS
+        if res[metric] is not None
+    )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", help="json file of the results")
+    parser.add_argument(
+        "--baseline",
+        default=BASELINE,
+        help="json file of the baseline results, empty for no comparison",
+    )
+    parser.add_argument("--quick", action="store_true", help="small grid")
+    parser.add_argument("--high-dim", action="store_true", help="30 variables")
+    parser.add_argument("--no-memory", action="store_true", help="no memory tracing")
+    parser.add_argument("--rtol", type=float, default=0.25)
+    args = parser.parse_args(args)
+    grid = GRID
+    if args.quick:
+        grid = QUICK_GRID
+    elif args.high_dim:
+        grid = HIGH_DIM_GRID
+    results = run_benchmark(grid, args.output, memory=not args.no_memory)
+    if args.baseline:
+        regressions = compare(results, args.baseline, rtol=args.rtol)
+        for reg in regressions:
+            print(
+                "regression",
+                " ".join(str(reg[key]) for key in CASE_KEYS),
+                reg["metric"],
+                reg["baseline"],
+                "->",
+                reg["new"],
+            )
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk memoization of expensive functions.
+"""
+
+import shelve
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows, where write_increase_iter does not fork
+    fcntl = None
+
+
+class CachedFunction(object):
+    """
+    Wraps a function taking x = ndarray[ne, nx] so that its values are
+    stored in a shelve file, and computed only for the points which are not
+    in the file. The other attributes are the ones of the function, such as
+    xlimits. Several threads or processes can share the file : it is locked
+    with fcntl while it is read or written, but not while fun runs, so that
+    their evaluations are not serialized. Without fcntl, only threads can
+    share it.
+    """
+
+    _TICK = "__tick__"
+
+    def __init__(self, fun, path, tol=0.0, max_size=100000):
+        """
+        Parameters
+        ----------
+        fun : function
+            function taking x = ndarray[ne, nx], returning ndarray[ne, ...].
+        path : str
+            shelve file of the stored values, created if needed.
+        tol : float, optional
+            points whose coordinates are equal once rounded to a multiple of
+            tol share their values, 0 for exactly equal points.
+            The default is 0.
+        max_size : int, optional
+            maximal number of stored points, the least recently used ones
+            are removed beyond. The default is 100000.
+        """
+        self.fun = fun
+        self.path = path
+        self.tol = tol
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name == "fun":  # not set yet
+            raise AttributeError(name)
+        return getattr(self.fun, name)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _key(self, xi):
+        if self.tol > 0:
+            xi = np.round(xi / self.tol)
+        return (np.asarray(xi, dtype=float) + 0.0).tobytes().hex()  # -0. -> 0.
+
+    def __call__(self, x):
+        """
+        Parameters
+        ----------
+        x : ndarray[ne, nx]
+            points to evaluate.
+
+        Returns
+        -------
+        ndarray[ne, ...]
+            values of fun at x, computed with one call of fun on the
+            points which are not stored.
+        """
+        x = np.atleast_2d(np.asarray(x, dtype=float))
+        keys = [self._key(xi) for xi in x]
+        values = [None] * len(x)
+        with self._open() as store:
+            tick = store.get(self._TICK, 0)
+            for i, key in enumerate(keys):
+                if key in store:
+                    tick += 1
+                    values[i] = store[key][1]
+                    store[key] = (tick, values[i])  # last use
+            store[self._TICK] = tick
+        missing = [i for i in range(len(x)) if values[i] is None]
+        self.hits += len(x) - len(missing)
+        self.misses += len(missing)
+        if len(missing) == 0:
+            return np.array(values)
+        new_values = self.fun(x[missing])
+        with self._open() as store:
+            tick = store.get(self._TICK, 0)
+            for i, value in zip(missing, new_values):
+                tick += 1
+                values[i] = value
+                store[keys[i]] = (tick, value)
+            store[self._TICK] = tick
+            if len(store) - 1 > self.max_size:
+                self._evict(store)
+        return np.array(values)
+
+    @contextmanager
+    def _open(self):
+        """
+        The shelve file, opened by one thread and one process at a time.
+        """
+        with self._lock, open(self.path + ".lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                with shelve.open(self.path) as store:
+                    yield store
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _evict(self, store):
+        """
+        Removes the least recently used points, down to 90% of max_size so
+        that the scan of the file is not done at each call.
+        """
+        keys = [key for key in store.keys() if key != self._TICK]
+        ticks = np.array([store[key][0] for key in keys])
+        n_remove = len(keys) - int(0.9 * self.max_size)
+        for i in np.argsort(ticks)[:n_remove]:
+            del store[keys[i]]
+
+    def __len__(self):
+        with self._open() as store:
+            return max(len(store) - 1, 0)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only checkpoint file of an optimization : a sequence of pickled
+records, one for the initial doe and one for each update of the models.
+"""
+
+import os
+import pickle
+
+
+def append_record(path, record):
+    """
+    Appends one record at the end of the file, so that the cost of a
+    checkpoint does not depend on the length of the history.
+
+    Parameters
+    ----------
+    path : str
+        checkpoint file, created if needed.
+    record : dictionnary
+        new evaluated points "x", "y", "y_c", with the hyperparameters of the
+        models "theta" and the state of the random generator "rng" after them.
+    """
+    with open(path, "ab") as fichier:
+        pickle.dump(record, fichier, protocol=pickle.HIGHEST_PROTOCOL)
+        fichier.flush()
+        os.fsync(fichier.fileno())
+
+
+def read_checkpoint(path, repair=False):
+    """
+    Reads the records of a checkpoint file. A last record truncated by an
+    interruption during its writing is ignored.
+
+    Parameters
+    ----------
+    path : str
+        checkpoint file.
+    repair : bool, optional
+        True to remove the truncated record from the file, so that new
+        records can be appended. The default is False.
+
+    Returns
+    -------
+    list of dictionnary
+        records in order of writing, see append_record.
+    """
+    records = []
+    with open(path, "rb") as fichier:
+        end = 0
+        while True:
+            try:
+                records.append(pickle.load(fichier))
+            except EOFError:
+                break
+            except Exception:  # truncated record
+                break
+            end = fichier.tell()
+    if repair and end < os.path.getsize(path):
+        with open(path, "r+b") as fichier:
+            fichier.truncate(end)
+    return records
@@ -6,7 +6,16 @@ Created on Mon Apr 26 10:26:43 2021
 """
 import numpy as np
 from scipy.stats import norm
+from scipy.special import ndtr
 from smoot.montecarlo import MonteCarlo
+from smoot.dominance import pareto_index, is_dominated
+from smoot.hypervolume import (
+    nondominated_boxes,
+    expected_improvement_boxes,
+    dominated_boxes,
+    hypervolume_improvement,
+    hypervolume_improvement_front,
+)
 
 
 class Criterion(object):
@@ -20,28 +29,99 @@ class Criterion(object):
         random_state=None,
         subcrit=None,
         transfo=None,
+        points=None,
+        sampling="random",
+        tol=None,
+        max_boxes=50000,
     ):
         self.models = models
         self.name = name
         self.ref = ref
         self.s = s
         self.hv = hv
-        self.points = 100 * len(models)  # maybe 100 too slow ?
+        # Monte-Carlo settings, for more than 2 objectives (3 for EHVI)
+        self.points = 100 * len(models) if points is None else points
+        self.tol = tol
+        # beyond, the Monte-Carlo EHVI is computed by blocks of samples
+        self.max_boxes = max_boxes
+        self.MC = MonteCarlo(random_state=random_state, method=sampling)
         self.random_state = random_state
         self.subcrit = subcrit
         self.transfo = transfo
+        self._training_data = None
+        self._check_front()
 
     def __call__(self, x, means=None, variances=None, pareto_front=None):
+        """
+        Evaluates the criterion on one point (x of shape [ndim], returns a float)
+        or on a whole population (x of shape [n, ndim], returns ndarray[n]).
+        """
+        single = np.ndim(x) == 1
+        x = np.atleast_2d(x)
         if self.name == "PI":
-            return self.PI(x)
-        if self.name == "EHVI":
-            return self.EHVI(x)
-        if self.name == "HV":
-            return self.HV(x)
-        if self.name == "WB2S":
-            return self.WB2S(x)
-        if self.name == "MPI":
-            return self.MPI(x)
+            values = self.PI(x)
+        elif self.name == "EHVI":
+            values = self.EHVI(x)
+        elif self.name == "HV":
+            values = self.HV(x)
+        elif self.name == "WB2S":
+            values = self.WB2S(x)
+        elif self.name == "MPI":
+            values = self.MPI(x)
+        else:
+            raise ValueError(f"unknown criterion {self.name}")
+        return values[0] if single else values
+
+    def _check_front(self):
+        """
+        Computes the current Pareto front once for a complete enrichment step,
+        and again only if the training data of the models has been changed.
+        Sets pareto_front : ndarray[n_pf, n_obj], the non-dominated training
+        outputs sorted along the first objective, and ehvi_front, the same
+        front padded with the boundaries used by the 2 objectives EHVI, or
+        ehvi_boxes, the box decomposition used by the 3 objectives EHVI, or
+        the one of the dominated region used by the Monte-Carlo EHVI, None
+        if it has more than max_boxes boxes.
+        """
+        training_data = [mod.training_points[None][0][1] for mod in self.models]
+        if self._training_data is not None and all(
+            new is old for new, old in zip(training_data, self._training_data)
+        ):
+            return
+        self._training_data = training_data
+        front = np.asarray(Criterion._compute_pareto(self.models))
+        self.pareto_front = np.ascontiguousarray(
+            front[np.argsort(front[:, 0], kind="stable")]
+        )
+        self.ehvi_front, self.ehvi_boxes = None, None
+        if self.ref is not None and len(self.models) == 3:
+            self.ehvi_boxes = nondominated_boxes(self.pareto_front, self.ref)
+        if self.ref is not None and len(self.models) > 3:
+            self.ehvi_boxes = dominated_boxes(
+                self.pareto_front, self.ref, self.max_boxes
+            )
+        if self.ref is not None and len(self.models) == 2:
+            self.ehvi_front = np.vstack(
+                (
+                    [self.ref[0], -1e15],  # 1e15 to approximate infinity
+                    self.pareto_front,
+                    [-1e15, self.ref[1]],
+                )
+            )
+
+    @staticmethod
+    def _predict(models, x):
+        """
+        One batched prediction per model.
+
+        Returns
+        -------
+        ndarray[n, n_models], ndarray[n, n_models]
+            means and standard deviations of the models at x.
+        """
+        moy = np.hstack([mod.predict_values(x) for mod in models])
+        var = np.hstack([mod.predict_variances(x) for mod in models])
+        return moy, np.sqrt(np.maximum(var, 0))
 
     def MPI(self, x):
         """
@@ -49,87 +129,103 @@ class Criterion(object):
 
         Parameters
         ----------
-        x : list
-            coordinate in the design point to evaluate.
+        x : ndarray[n, n_dim]
+            coordinates in the design space of the points to evaluate.
 
         Returns
         -------
-        float
+        ndarray[n]
             MPI(x).
         """
-        x = np.asarray(x).reshape(1, -1)
-
-        pf = Criterion._compute_pareto(self.models)
-        variances = [mod.predict_variances for mod in self.models]
-        etypes = [var(x)[0][0] ** 0.5 for var in variances]
-        if 0 in etypes:  # training point
-            return 0
-        moyennes = [mod.predict_values for mod in self.models]
-        moy = [m(x)[0][0] for m in moyennes]
-        probas = [
-            np.prod(
-                [norm.cdf((moy[i] - f[i]) / etypes[i]) for i in range(len(moyennes))]
-            )
-            for f in pf
-        ]
-
-        return 1 - max(probas)  # min( 1 - P )
+        self._check_front()
+        pf = self.pareto_front
+        moy, etypes = Criterion._predict(self.models, x)
+        training = np.any(etypes == 0, axis=1)  # training points
+        etypes[training] = 1
+        # probas[i, j] : probability that x_i is dominated by the front point j
+        probas = ndtr((moy[:, None, :] - pf) / etypes[:, None, :]).prod(axis=2)
+        return np.where(training, 0, 1 - probas.max(axis=1))  # min( 1 - P )
 
     def PI(self, x):
         """
-        Probability of improvement of the point x for 2 objectives.
+        Probability of improvement of the points x for 2 objectives.
         If more than 2 objectives, computed using Monte-Carlo sampling instead
 
         Parameters
         ----------
-        x : list
-            coordinates in the design space of the point to evaluate.
+        x : ndarray[n, n_dim]
+            coordinates in the design space of the points to evaluate.
 
         Returns
         -------
-        pi_x : float
+        pi_x : ndarray[n]
             PI(x) : probability that x is an improvement € [0,1]
         """
-
-        x = np.asarray(x).reshape(1, -1)
-        pareto_front = Criterion._compute_pareto(self.models)
+        self._check_front()
+        pareto_front = self.pareto_front
+        moy, sig = Criterion._predict(self.models, x)
 
         if len(self.models) > 2:
-            y = np.asarray(
-                [
-                    mod.predict_values(x)[0][0]
-                    - 3 * mod.predict_variances(x)[0][0] ** 0.5
-                    for mod in self.models
-                ]
+            pi_x = np.zeros(x.shape[0])
+            # if the point - 3sigma is dominated, almost no chances of improvement
+            todo = ~is_dominated(moy - 3 * sig, pareto_front)
+            if np.any(todo):
+                pi_x[todo] = self.MC.estimate(
+                    moy[todo],
+                    sig[todo],
+                    lambda q: ~is_dominated(q, pareto_front),
+                    self.points,
+                    self.tol,
+                )
+            return pi_x
+
+        training = (sig[:, 0] == 0) | (sig[:, 1] == 0)  # variances = 0
+        sig[training] = 1
+        pi_x = Criterion._PI_2obj(pareto_front, moy, sig)[0]
+        return np.where(training, 0, pi_x)
+
+    @staticmethod
+    def _PI_2obj(pareto_front, moy, sig, derivatives=False):
+        """
+        2 objectives PI kernel, and if derivatives its partial derivatives
+        wrt the means and the standard deviations, ndarray[n, 2] each.
+        """
+        # z[:, i, k] = (pareto_front[i][k] - µk) / sk
+        z = (pareto_front - moy[:, None, :]) / sig[:, None, :]
+        cdf = ndtr(z)  # P(y_k(x) < pareto_front[i][k]), in one call
+        c1, c2 = cdf[:, :, 0], cdf[:, :, 1]
+        pi_x = (
+            c1[:, 0]
+            + ((c1[:, 2:] - c1[:, 1:-1]) * c2[:, 2:]).sum(axis=1)
+            + (1 - c1[:, -1]) * c2[:, -1]
+        )
+        if not derivatives:
+            return pi_x, None, None
+        dc1, dc2 = np.zeros_like(c1), np.zeros_like(c2)  # d pi_x / d cdf
+        dc1[:, 0] += 1
+        dc1[:, 2:] += c2[:, 2:]
+        dc1[:, 1:-1] -= c2[:, 2:]
+        dc2[:, 2:] += c1[:, 2:] - c1[:, 1:-1]
+        dc1[:, -1] -= c2[:, -1]
+        dc2[:, -1] += 1 - c1[:, -1]
+        dcdf = np.stack((dc1, dc2), axis=2) * np.exp(-(z ** 2) / 2) / np.sqrt(2 * np.pi)
+        d_moy = -(dcdf.sum(axis=1)) / sig
+        d_sig = -(dcdf * z).sum(axis=1) / sig
+        return pi_x, d_moy, d_sig
+
+    def _hvi(self, q):
+        """Hypervolume improvement of the samples q, ndarray[n, n_samples, n_obj]"""
+        hvi = np.zeros(q.shape[:2])
+        improving = ~is_dominated(q, self.pareto_front)  # the others improve nothing
+        if self.ehvi_boxes is None:
+            hvi[improving] = hypervolume_improvement_front(
+                q[improving], self.pareto_front, self.ref, self.max_boxes
             )
-            if Criterion.is_dominated(y, pareto_front):
-                return 0  # the point - 3sigma is dominated, almost no chances of improvement
-            MC = MonteCarlo(random_state=self.random_state)
-            q = MC.sampling(x, self.models, self.points)
-            return (
-                self.points
-                - sum([Criterion.is_dominated(qi, pareto_front) for qi in q])
-            ) / self.points  # maybe we can remove the division by self.points as there is the same amount of points for each call? It's just for scale here
-
-        pareto_front.sort(key=lambda x: x[0])
-        moyennes = [mod.predict_values for mod in self.models]
-        variances = [mod.predict_variances for mod in self.models]
-        sig1, sig2 = variances[0](x)[0][0] ** 0.5, variances[1](x)[0][0] ** 0.5
-        moy1, moy2 = moyennes[0](x)[0][0], moyennes[1](x)[0][0]
-        m = len(pareto_front)
-        try:
-            pi_x = norm.cdf((pareto_front[0][0] - moy1) / sig1)
-            for i in range(1, m - 1):
-                pi_x += (
-                    norm.cdf((pareto_front[i + 1][0] - moy1) / sig1)
-                    - norm.cdf((pareto_front[i][0] - moy1) / sig1)
-                ) * norm.cdf((pareto_front[i + 1][1] - moy2) / sig2)
-            pi_x += (1 - norm.cdf((pareto_front[m - 1][0] - moy1) / sig1)) * norm.cdf(
-                (pareto_front[m - 1][1] - moy2) / sig2
+        else:
+            hvi[improving] = hypervolume_improvement(
+                q[improving], *self.ehvi_boxes, self.ref
             )
-            return pi_x
-        except ZeroDivisionError:  # for training points -> variances = 0
-            return 0
+        return hvi
 
     @staticmethod
     def psi(a, b, µ, s):
@@ -140,60 +236,133 @@ class Criterion(object):
         x,
     ):
         """
-        Expected hypervolume improvement of the point x for 2 objectives.
-        If more than 2 objectives, computed using Monte-Carlo sampling instead
+        Expected hypervolume improvement of the points x for 2 objectives.
+        For 3 objectives, it is computed exactly on the boxes of the non-dominated
+        region. If more than 3 objectives, computed using Monte-Carlo sampling instead,
+        the improvement of the samples being computed on the boxes of the dominated
+        region, or by blocks of close samples if there are more than max_boxes
+        of them, see hypervolume_improvement_front
 
         Parameters
         ----------
-        x : list
-            coordinates in the design space of the point to evaluate.
+        x : ndarray[n, n_dim]
+            coordinates in the design space of the points to evaluate.
 
         Returns
         -------
-        float
+        ndarray[n]
             Expected HVImprovement
         """
+        self._check_front()
+        f = self.pareto_front
+        moy, sig = Criterion._predict(self.models, x)
+
+        if len(self.models) == 3:
+            training = np.any(sig == 0, axis=1)
+            ehvi = np.zeros(x.shape[0])
+            ehvi[~training] = expected_improvement_boxes(
+                moy[~training], sig[~training], *self.ehvi_boxes
+            )
+            return ehvi
+
+        if len(self.models) > 3:
+            ehvi = np.zeros(x.shape[0])
+            # if the point - 3sigma is dominated, no chances to improve hv
+            todo = np.flatnonzero(~is_dominated(moy - 3 * sig, f))
+            if len(todo) > 0:
+                ehvi[todo] = self.MC.estimate(
+                    moy[todo], sig[todo], self._hvi, self.points, self.tol
+                )
+            return ehvi
+
+        training = (sig[:, 0] == 0) | (sig[:, 1] == 0)
+        sig[training] = 1
+        ehvi = Criterion._EHVI_2obj(self.ehvi_front, moy, sig)[0]
+        return np.where(training, 0, ehvi)
 
-        x = np.asarray(x).reshape(1, -1)
-        f = Criterion._compute_pareto(self.models)
-
-        if len(self.models) > 2:
-            y = np.asarray(
-                [
-                    mod.predict_values(x)[0][0]
-                    - 3 * mod.predict_variances(x)[0][0] ** 0.5
-                    for mod in self.models
-                ]
+    @staticmethod
+    def _EHVI_2obj(f, moy, sig, derivatives=False):
+        """
+        2 objectives EHVI kernel on the padded front f, and if derivatives
+        its partial derivatives wrt the means and the standard deviations.
+        Same sums as with Criterion.psi, with one cdf and one pdf call.
+        """
+        # z[:, i, k] = (f[i][k] - µk) / sk
+        z = (f - moy[:, None, :]) / sig[:, None, :]
+        cdf = ndtr(z)
+        pdf = np.exp(-(z ** 2) / 2) / np.sqrt(2 * np.pi)
+        s1, s2 = sig[:, [0]], sig[:, [1]]
+        z1, z2 = z[:, :, 0], z[:, :, 1]
+        psi_1 = s1 * (pdf[:, :, 0] + z1 * cdf[:, :, 0])  # psi(f[i][0], f[i][0], µ1, s1)
+        psi_2 = s2 * (pdf[:, :, 1] + z2 * cdf[:, :, 1])  # psi(f[i][1], f[i][1], µ2, s2)
+        # psi(f[i][0], f[i + 1][0], µ1, s1)
+        psi_12 = s1 * pdf[:, 1:, 0] + s1 * z1[:, :-1] * cdf[:, 1:, 0]
+        width = f[:-1, 0] - f[1:, 0]
+        res1 = width * cdf[:, 1:, 0] * psi_2[:, 1:]
+        res2 = (psi_1[:, :-1] - psi_12) * psi_2[:, :-1]
+        ehvi = res1.sum(axis=1) + res2.sum(axis=1)
+        if not derivatives:
+            return ehvi, None, None
+        # d psi(a, b, µ, s) / dµ = pdf(zb) (zb - za) - cdf(zb)
+        # d psi(a, b, µ, s) / ds = pdf(zb) (1 + zb^2 - za zb)
+        p1, p2 = pdf[:, 1:, 0], pdf[:, :, 1]
+        dpsi_12_m = p1 * (z1[:, 1:] - z1[:, :-1]) - cdf[:, 1:, 0]
+        dpsi_12_s = p1 * (1 + z1[:, 1:] ** 2 - z1[:, :-1] * z1[:, 1:])
+        d_moy = np.column_stack(
+            (
+                (-width * p1 / s1 * psi_2[:, 1:]).sum(axis=1)
+                + ((-cdf[:, :-1, 0] - dpsi_12_m) * psi_2[:, :-1]).sum(axis=1),
+                (-width * cdf[:, 1:, 0] * cdf[:, 1:, 1]).sum(axis=1)
+                - ((psi_1[:, :-1] - psi_12) * cdf[:, :-1, 1]).sum(axis=1),
             )
-            if Criterion.is_dominated(y, f):
-                return 0  # the point - 3sigma is dominated, no chances to improve hv
-            MC = MonteCarlo(random_state=self.random_state)
-            q = MC.sampling(x, self.models, self.points)
-            return (
-                sum([self.hv.calc(np.vstack((f, qi))) for qi in q]) / self.points
-            )  # maybe we can remove the division by self.points as there is the same amount of points for each call? It's just for scale here
-
-        variances = [mod.predict_variances for mod in self.models]
-        s1, s2 = variances[0](x)[0][0] ** 0.5, variances[1](x)[0][0] ** 0.5
-        if s1 == 0 or s2 == 0:  # training point
-            return 0
-        moyennes = [mod.predict_values for mod in self.models]
-        µ1, µ2 = moyennes[0](x)[0][0], moyennes[1](x)[0][0]
-        f.sort(key=lambda x: x[0])
-        f.insert(0, np.array([self.ref[0], -1e15]))  # 1e15 to approximate infinity
-        f.append(np.array([-1e15, self.ref[1]]))
-        res1, res2 = 0, 0
-        for i in range(len(f) - 1):
-            res1 += (
-                (f[i][0] - f[i + 1][0])
-                * norm.cdf((f[i + 1][0] - µ1) / s1)
-                * Criterion.psi(f[i + 1][1], f[i + 1][1], µ2, s2)
+        )
+        d_sig = np.column_stack(
+            (
+                (-width * p1 * z1[:, 1:] / s1 * psi_2[:, 1:]).sum(axis=1)
+                + ((pdf[:, :-1, 0] - dpsi_12_s) * psi_2[:, :-1]).sum(axis=1),
+                (width * cdf[:, 1:, 0] * p2[:, 1:]).sum(axis=1)
+                + ((psi_1[:, :-1] - psi_12) * p2[:, :-1]).sum(axis=1),
             )
-            res2 += (
-                Criterion.psi(f[i][0], f[i][0], µ1, s1)
-                - Criterion.psi(f[i][0], f[i + 1][0], µ1, s1)
-            ) * Criterion.psi(f[i][1], f[i][1], µ2, s2)
-        return res1 + res2
+        )
+        return ehvi, d_moy, d_sig
+
+    def value_and_gradient(self, x):
+        """
+        Analytic gradient of the 2 objectives PI and EHVI, through the
+        gradients of the means and variances of the models.
+
+        Parameters
+        ----------
+        x : ndarray[n, n_dim]
+            coordinates in the design space of the points to evaluate.
+
+        Returns
+        -------
+        ndarray[n], ndarray[n, n_dim]
+            criterion and its gradient at x, or None if there is no analytic
+            gradient for this criterion or these models.
+        """
+        if self.name not in ["PI", "EHVI"] or len(self.models) != 2:
+            return None
+        grads = [
+            mod.predict_gradients(x) if hasattr(mod, "predict_gradients") else None
+            for mod in self.models
+        ]
+        if any(g is None for g in grads):
+            return None
+        self._check_front()
+        moy, sig = Criterion._predict(self.models, x)
+        training = (sig[:, 0] == 0) | (sig[:, 1] == 0)
+        sig[training] = 1
+        if self.name == "PI":
+            val, d_moy, d_sig = Criterion._PI_2obj(self.pareto_front, moy, sig, True)
+        else:
+            val, d_moy, d_sig = Criterion._EHVI_2obj(self.ehvi_front, moy, sig, True)
+        grad = np.zeros(x.shape)
+        for k, (dmean, dvar) in enumerate(grads):
+            grad += d_moy[:, [k]] * dmean + d_sig[:, [k]] * dvar / (2 * sig[:, [k]])
+        val[training], grad[training] = 0, 0
+        return val, grad
 
     def HV(self, x):
         """
@@ -203,19 +372,18 @@ class Criterion(object):
 
         Parameters
         ----------
-        x : list
-            coordinates in the design space of the point to evaluate.
+        x : ndarray[n, n_dim]
+            coordinates in the design space of the points to evaluate.
 
         Returns
         -------
-        out : float
+        out : ndarray[n]
             Hypervolume of the current front concatened with µ(x)
         """
-        x = np.asarray(x).reshape(1, -1)
-        pf = Criterion._compute_pareto(self.models)
-        moyennes = [mod.predict_values for mod in self.models]
-        y = np.asarray([moy(x)[0][0] for moy in moyennes])
-        return self.hv.calc(np.vstack((pf, y)))
+        self._check_front()
+        pf = self.pareto_front
+        y = np.hstack([mod.predict_values(x) for mod in self.models])
+        return np.array([self.hv.calc(np.vstack((pf, yi))) for yi in y])
 
     def WB2S(self, x):
         """
@@ -226,31 +394,29 @@ class Criterion(object):
 
         Parameters
         ----------
-        x : list
-            coordinates in the design space of the point to evaluate.
+        x : ndarray[n, n_dim]
+            coordinates in the design space of the points to evaluate.
 
         Returns
         -------
-        WBS2 : float
+        WBS2 : ndarray[n]
         """
-        x = np.asarray(x).reshape(1, -1)
-        moyennes = [mod.predict_values for mod in self.models]
-        µ = [moy(x)[0][0] for moy in moyennes]
-        return self.s * self.subcrit(x) - self.transfo(µ)
+        µ = np.hstack([mod.predict_values(x) for mod in self.models])
+        # transfo takes the list of the means of one point, as for s
+        transfo = np.array([self.transfo(list(µi)) for µi in µ], dtype=float)
+        return self.s * self.subcrit(x) - transfo
 
     @staticmethod
     def _compute_pareto(modeles):
         """
-        Set curr_pareto_front to the non-dominated training points.
-        It allows to compute it once for a complete enrichment step
+        Non-dominated training points of the models.
+        Criterion objects keep it in pareto_front, see _check_front.
         """
         ydata = np.transpose(
             np.asarray([mod.training_points[None][0][1] for mod in modeles])
         )[0]
-        pareto_index = Criterion.pareto(ydata)
-        # self.curr_pareto_front = [ydata[i] for i in pareto_index]
-        # I remove this and the associated self. variable beacause for a reason that I do not unserstand, it is way faster to recompute it at every call than to store it
-        return [ydata[i] for i in pareto_index]
+        index = Criterion.pareto(ydata)
+        return [ydata[i] for i in index]
 
     @staticmethod
     def pareto(Y):
@@ -265,25 +431,7 @@ class Criterion(object):
         index : list
             list of the indexes in Y of the Pareto-optimal points.
         """
-        index = []  # indexes of the best points (Pareto)
-        n = len(Y)
-        dominated = [False] * n
-        for y in range(n):
-            if not dominated[y]:
-                for y2 in range(y + 1, n):
-                    if not dominated[
-                        y2
-                    ]:  # if y2 is dominated (by y0), we already compared y0 to y
-                        y_domine_y2, y2_domine_y = Criterion.dominate_min(Y[y], Y[y2])
-
-                        if y_domine_y2:
-                            dominated[y2] = True
-                        if y2_domine_y:
-                            dominated[y] = True
-                            break
-                if not dominated[y]:
-                    index.append(y)
-        return index
+        return list(pareto_index(Y))
 
     # returns a-dominates-b , b-dominates-a !! for minimization !!
     @staticmethod
@@ -323,11 +471,7 @@ class Criterion(object):
     @staticmethod
     def is_dominated(y, pf):
         """True if y is dominated by a point of pf"""
-        for z in pf:
-            battu, _ = Criterion.dominate_min(z, y)
-            if battu:
-                return True
-        return False
+        return bool(is_dominated(y, pf))
 
     @staticmethod
     def prob_of_feasability(x, const_modeles):
@@ -335,12 +479,11 @@ class Criterion(object):
         Product of the probabilities that x is a feasible solution,
         assuming that the constraints are independents, and modelized by
         gaussian models.
+        x is one point ndarray[n_dim] or a population ndarray[n, n_dim].
         """
-        means = [mod.predict_values for mod in const_modeles]
-        var = [mod.predict_variances for mod in const_modeles]
-        x = np.asarray(x).reshape(1, -1)
-        probs = [
-            norm.cdf(-means[i](x)[0][0] / var[i](x)[0][0])
-            for i in range(len(const_modeles))
-        ]
-        return np.prod(probs)
+        single = np.ndim(x) == 1
+        x = np.atleast_2d(x)
+        means = np.hstack([mod.predict_values(x) for mod in const_modeles])
+        var = np.hstack([mod.predict_variances(x) for mod in const_modeles])
+        probs = np.prod(norm.cdf(-means / var), axis=1)
+        return probs[0] if single else probs
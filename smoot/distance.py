@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Pairwise euclidean distances computed by blocks.
+"""
+
+import numpy as np
+from scipy.spatial.distance import cdist
+
+
+def sum_of_distances(A, B, max_size=2 ** 22):
+    """
+    Sum of the distances of each point of A to all the points of B.
+
+    Parameters
+    ----------
+    A : array-like[n, d]
+        points whose distances are summed.
+    B : array-like[m, d]
+        points to which the distances are computed.
+    max_size : int, optional
+        maximal number of elements of the distance matrices, the points of A
+        are processed by blocks to bound the memory. The default is 2 ** 22.
+
+    Returns
+    -------
+    ndarray[n]
+        sum over j of ||A[i] - B[j]|| for each i.
+    """
+    A = np.asarray(A, dtype=float)
+    B = np.asarray(B, dtype=float)
+    A, B = A.reshape(len(A), -1), B.reshape(len(B), -1)
+    res = np.zeros(len(A))
+    if len(B) == 0:
+        return res
+    block = max(1, max_size // len(B))
+    for start in range(0, len(A), block):
+        res[start : start + block] = cdist(A[start : start + block], B).sum(axis=1)
+    return res
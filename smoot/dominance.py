@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+"""
+Non-dominated filtering and sorting, for minimization.
+Two points with the same values do not dominate each other.
+"""
+
+import numpy as np
+
+
+def pareto_index(Y):
+    """
+    Parameters
+    ----------
+    Y : array-like[n, n_obj]
+        points to compare.
+
+    Returns
+    -------
+    ndarray[int]
+        increasing indexes in Y of the Pareto-optimal points.
+    """
+    Y = np.asarray(Y, dtype=float)
+    if len(Y) == 0:
+        return np.zeros(0, dtype=int)
+    Y = Y.reshape(len(Y), -1)
+    if Y.shape[1] == 1:
+        return np.flatnonzero(Y[:, 0] == Y[:, 0].min())
+    if Y.shape[1] == 2:
+        return np.flatnonzero(~_dominated_2d(Y))
+    return np.sort(_cull(Y))
+
+
+def _cull(Y):
+    """
+    Filter for more than 2 objectives. A point can only be dominated by points
+    with a lower sum of objectives, so in increasing sum order, the first
+    remaining point is Pareto-optimal and removes the points it dominates.
+    Costs one vectorized comparison per Pareto-optimal point.
+    """
+    candidates = np.argsort(Y.sum(axis=1), kind="stable")
+    i = 0
+    while i < len(candidates):
+        p = Y[candidates[i]]
+        later = Y[candidates[i + 1 :]]
+        dominated = np.all(p <= later, axis=1) & np.any(p < later, axis=1)
+        candidates = np.concatenate(
+            (candidates[: i + 1], candidates[i + 1 :][~dominated])
+        )
+        i += 1
+    return candidates
+
+
+def _dominated_2d(Y):
+    """
+    O(n log n) sweep for 2 objectives : along the first objective, a point is
+    dominated by a point with a lower first objective and a lower or equal
+    second one, or by a point with the same first objective and a lower second one.
+    """
+    n = len(Y)
+    order = np.lexsort((Y[:, 1], Y[:, 0]))
+    f1, f2 = Y[order, 0], Y[order, 1]
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = f1[1:] != f1[:-1]
+    group_start = np.maximum.accumulate(np.where(new_group, np.arange(n), 0))
+    best_before = np.minimum.accumulate(f2)
+    prev_min = np.full(n, np.inf)
+    has_prev = group_start > 0
+    prev_min[has_prev] = best_before[group_start[has_prev] - 1]
+    dominated = np.empty(n, dtype=bool)
+    dominated[order] = (prev_min <= f2) | (f2[group_start] < f2)
+    return dominated
+
+
+def is_dominated(Y, pf):
+    """
+    Parameters
+    ----------
+    Y : array-like[..., n_obj]
+        points to test.
+    pf : array-like[n_pf, n_obj]
+        reference points, usually a Pareto front.
+
+    Returns
+    -------
+    ndarray[...] of bool
+        True where the point of Y is dominated by a point of pf.
+    """
+    pf = np.asarray(pf, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    if pf.size == 0:
+        return np.zeros(Y.shape[:-1], dtype=bool)
+    Y = Y[..., None, :]
+    return np.any(np.all(pf <= Y, axis=-1) & np.any(pf < Y, axis=-1), axis=-1)
+
+
+def dominance_matrix(Y, block_size=1000):
+    """
+    Parameters
+    ----------
+    Y : array-like[n, n_obj]
+        points to compare.
+    block_size : int, optional
+        number of rows computed at once. The default is 1000.
+
+    Returns
+    -------
+    ndarray[n, n] of bool
+        element [i, j] is True if Y[i] dominates Y[j].
+    """
+    Y = np.asarray(Y, dtype=float)
+    n = len(Y)
+    dom = np.zeros((n, n), dtype=bool)
+    for start in range(0, n, block_size):
+        a = Y[start : start + block_size, None, :]
+        dom[start : start + block_size] = np.all(a <= Y, axis=-1) & np.any(
+            a < Y, axis=-1
+        )
+    return dom
+
+
+def non_dominated_sort(Y, block_size=1000):
+    """
+    Full non-dominated ranking : the first front is the Pareto front of Y,
+    the second one the Pareto front of Y without the first front, etc.
+
+    Parameters
+    ----------
+    Y : array-like[n, n_obj]
+        points to sort.
+    block_size : int, optional
+        see dominance_matrix. The default is 1000.
+
+    Returns
+    -------
+    fronts : list of ndarray[int]
+        fronts[k] contains the increasing indexes in Y of the front k+1.
+    """
+    Y = np.asarray(Y, dtype=float)
+    if len(Y) == 0:
+        return []
+    Y = Y.reshape(len(Y), -1)
+    dom = dominance_matrix(Y, block_size)
+    n_dominating = dom.sum(axis=0)
+    ranked = np.zeros(len(Y), dtype=bool)
+    fronts = []
+    while not ranked.all():
+        front = np.flatnonzero((n_dominating == 0) & ~ranked)
+        fronts.append(front)
+        ranked[front] = True
+        n_dominating -= dom[front].sum(axis=0)
+    return fronts
+
+
+def non_dominated_rank(Y, block_size=1000):
+    """
+    Returns
+    -------
+    ndarray[n] of int
+        rank of each point of Y, 1 for the Pareto front. See non_dominated_sort.
+    """
+    rank = np.zeros(len(Y), dtype=int)
+    for k, front in enumerate(non_dominated_sort(Y, block_size)):
+        rank[front] = k + 1
+    return rank
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+DTLZ test problems, scalable in number of objectives.
+"""
+
+import numpy as np
+from smt.problems.problem import Problem
+
+# intervals of each of the first n_obj - 1 objectives on the front of DTLZ7
+DTLZ7_INTERVALS = [[0, 0.2514118360], [0.6316265307, 0.8594008566]]
+
+
+class DTLZ(Problem):
+    """
+    DTLZ toolkit, with n_obj objectives
+    x = {x1.. xn}
+    y = {x1.. x(n_obj-1)} : position on the front
+    z = {x(n_obj).. xn} = {z1.. zk} : distance to the front, g(z) = 0
+    Testing functions with the shape :
+        fi : y,z -> (1 + g(z)) * hi(y)
+    with hi linear (1), spherical (2, 3, 4), degenerated (5, 6)
+    or disconnected (7)
+    xbounds = [0,1]**n
+    """
+
+    def _initialize(self):
+        self.options.declare("ndim", 7, types=int)
+        self.options.declare("n_obj", 3, types=int)
+        self.options.declare("name", "DTLZ", types=str)
+        self.options.declare(
+            "type", 1, values=[1, 2, 3, 4, 5, 6, 7], types=int
+        )  # one of the 7 test functions
+        self.options.declare("alpha", 100.0, types=float)  # exponent of DTLZ4
+
+    def _setup(self):
+        if not 2 <= self.options["n_obj"] <= self.options["ndim"]:
+            raise ValueError("DTLZ needs 2 <= n_obj <= ndim")
+        self.xlimits[:, 1] = 1.0
+
+    def _evaluate(self, x, kx=None):
+        """
+        Arguments
+        ---------
+        x : ndarray[ne, n_dim]
+            Evaluation points.
+
+        Returns
+        -------
+        ndarray[ne, n_obj]
+            Functions values.
+        """
+        m = self.options["n_obj"]
+        typ = self.options["type"]
+        y, z = x[:, : m - 1], x[:, m - 1 :]
+        k = z.shape[1]
+
+        # g
+        if typ in [1, 3]:
+            g = 100 * (
+                k
+                + np.sum(
+                    (z - 0.5) ** 2 - np.cos(20 * np.pi * (z - 0.5)),
+                    axis=1,
+                    keepdims=True,
+                )
+            )
+        elif typ in [2, 4, 5]:
+            g = np.sum((z - 0.5) ** 2, axis=1, keepdims=True)
+        elif typ == 6:
+            g = np.sum(z ** 0.1, axis=1, keepdims=True)
+        else:
+            g = 1 + 9 / k * np.sum(z, axis=1, keepdims=True)
+
+        # h
+        if typ == 1:
+            return 0.5 * (1 + g) * _front(y, 1 - y)
+        if typ == 7:
+            f = y * (1 + np.sin(3 * np.pi * y)) / (1 + g)
+            return np.hstack((y, (1 + g) * (m - np.sum(f, axis=1, keepdims=True))))
+        if typ == 4:
+            y = y ** self.options["alpha"]
+        theta = np.pi / 2 * y
+        if typ in [5, 6]:
+            theta[:, 1:] = np.pi / (4 * (1 + g)) * (1 + 2 * g * y[:, 1:])
+        return (1 + g) * _front(np.cos(theta), np.sin(theta))
+
+    def pareto(self, npoints=300, random_state=None):
+        """
+        Give points of the pareto set and front, useful for plots and
+        solver's quality comparition. The points of the linear and spherical
+        fronts are uniformly drawn on the front, the others on the Pareto set.
+
+        Parameters
+        ----------
+        npoints : int, optional
+            Number of points to generate. The default is 300.
+
+        Returns
+        -------
+        X,Y : ndarray[npoints, ndim], ndarray[npoints, n_obj]
+            X are points from the pareto set, Y their values.
+        """
+        rand = np.random.RandomState(random_state)
+        m = self.options["n_obj"]
+        typ = self.options["type"]
+        X = np.zeros((npoints, self.options["ndim"]))
+        if typ in [1, 2, 3, 4, 5]:
+            X[:, m - 1 :] = 0.5  # g = 0
+        if typ == 1:
+            # uniform on the simplex sum(f) = 1/2
+            X[:, : m - 1] = _front_position(rand.dirichlet(np.ones(m), npoints))
+        elif typ in [2, 3, 4]:
+            # uniform on the unit sphere
+            f = np.abs(rand.normal(size=(npoints, m)))
+            f /= np.linalg.norm(f, axis=1, keepdims=True)
+            X[:, : m - 1] = _front_position(f, spherical=True)
+            if typ == 4:
+                X[:, : m - 1] **= 1 / self.options["alpha"]
+        elif typ in [5, 6]:
+            # curve, the other angles being pi/4 whatever y when g = 0
+            X[:, 0] = rand.uniform(0, 1, npoints)
+            X[:, 1 : m - 1] = 0.5
+        else:
+            lengths = [b - a for a, b in DTLZ7_INTERVALS]
+            pt = rand.uniform(0, sum(lengths), (npoints, m - 1))
+            X[:, : m - 1] = np.where(
+                pt > lengths[0], DTLZ7_INTERVALS[1][0] + pt - lengths[0], pt
+            )
+        return X, self._evaluate(X)
+
+
+def _front(c, s):
+    """
+    Products of the DTLZ objectives :
+        f1 = c1 c2 ... c(m-1)
+        fi = c1 ... c(m-i) s(m-i+1)
+        fm = s1
+
+    Parameters
+    ----------
+    c, s : ndarray[ne, m - 1]
+        factors of each position variable.
+
+    Returns
+    -------
+    ndarray[ne, m]
+        the m products.
+    """
+    ne = len(c)
+    prods = np.hstack((np.ones((ne, 1)), np.cumprod(c, axis=1)))
+    return (prods * np.hstack((s, np.ones((ne, 1)))))[:, ::-1]
+
+
+def _front_position(f, spherical=False):
+    """
+    Inverse of _front on the front : position variables giving the points f
+    of the simplex (sum(f) = 1, scale free) or of the unit sphere.
+
+    Parameters
+    ----------
+    f : ndarray[ne, m]
+        points of the front.
+    spherical : bool, optional
+        True for the sphere, False for the simplex. The default is False.
+
+    Returns
+    -------
+    ndarray[ne, m - 1]
+        position variables in [0, 1].
+    """
+    f = f[:, ::-1]
+    if spherical:
+        # f(i) = r(i) sin(theta(i)), the norm of the next ones is r(i) cos(theta(i))
+        rest = np.sqrt(np.cumsum((f ** 2)[:, ::-1], axis=1)[:, ::-1])[:, 1:]
+        return np.arctan2(f[:, :-1], rest) * 2 / np.pi
+    # f(i) = r(i) (1 - x(i)) and the sum of the next ones is r(i) x(i)
+    rest = np.cumsum(f[:, ::-1], axis=1)[:, ::-1][:, 1:]
+    total = f[:, :-1] + rest
+    return np.divide(rest, total, out=np.full_like(rest, 0.5), where=total > 0)
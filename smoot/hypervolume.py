@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+Box decompositions of the objective space around a Pareto front, for
+minimization, and the hypervolume quantities computed on them.
+"""
+
+import numpy as np
+from scipy.stats import norm
+
+from smoot.dominance import pareto_index
+
+
+def nondominated_boxes(front, ref):
+    """
+    Decomposition of the region below ref which is not dominated by the front
+    into disjoint boxes, by slicing along the last objective and decomposing
+    recursively the section of each slice.
+
+    Parameters
+    ----------
+    front : array-like[n_pf, n_obj]
+        Pareto front.
+    ref : array-like[n_obj]
+        reference point.
+
+    Returns
+    -------
+    lower : ndarray[n_boxes, n_obj]
+        lower corners of the boxes, possibly -inf.
+    upper : ndarray[n_boxes, n_obj]
+        upper corners of the boxes.
+    """
+    ref = np.asarray(ref, dtype=float)
+    front = np.asarray(front, dtype=float).reshape(-1, len(ref))
+    front = front[np.all(front < ref, axis=1)]  # the others do not cut the region
+    if len(ref) == 1:
+        top = front[:, 0].min() if len(front) > 0 else ref[0]
+        return np.array([[-np.inf]]), np.array([[top]])
+    bounds = np.concatenate(([-np.inf], np.unique(front[:, -1]), [ref[-1]]))
+    lowers, uppers = [], []
+    for k in range(len(bounds) - 1):
+        section = front[front[:, -1] <= bounds[k], :-1]
+        section = section[pareto_index(section)]
+        lower, upper = nondominated_boxes(section, ref[:-1])
+        lowers.append(np.hstack((lower, np.full((len(lower), 1), bounds[k]))))
+        uppers.append(np.hstack((upper, np.full((len(upper), 1), bounds[k + 1]))))
+    return np.vstack(lowers), np.vstack(uppers)
+
+
+def dominated_boxes(front, ref, max_boxes=None):
+    """
+    Decomposition of the region between the front and ref into disjoint boxes,
+    by slicing along the last objective and decomposing recursively the
+    section of each slice, the slices of 3 objectives being all computed at
+    once. The boxes of consecutive slices which have the same section are
+    merged, so that a box spans all the slices where it is unchanged. The sum
+    of the volumes is the hypervolume of the front.
+
+    The number of boxes still grows quickly with the number of objectives,
+    about 1500 boxes for 60 points of a spherical front of 5 objectives and
+    2000 for 40 points and 6 objectives, built in 0.5 s and 3 s, which is why
+    it can be bounded by max_boxes.
+
+    Parameters
+    ----------
+    front : array-like[n_pf, n_obj]
+        Pareto front, its dominated points being ignored.
+    ref : array-like[n_obj]
+        reference point.
+    max_boxes : int, optional
+        maximal number of boxes, the decomposition is abandoned beyond.
+        The default is None, no limit.
+
+    Returns
+    -------
+    lower : ndarray[n_boxes, n_obj]
+        lower corners of the boxes.
+    upper : ndarray[n_boxes, n_obj]
+        upper corners of the boxes.
+    or None if there are more than max_boxes boxes.
+    """
+    ref = np.asarray(ref, dtype=float)
+    front = np.asarray(front, dtype=float).reshape(-1, len(ref))
+    front = front[np.all(front < ref, axis=1)]
+    if len(front) == 0:
+        return np.zeros((0, len(ref))), np.zeros((0, len(ref)))
+    if len(ref) == 1:
+        return np.array([[front[:, 0].min()]]), ref.reshape(1, 1)
+    if len(ref) == 2:
+        # staircase : each point of the front, sorted along the first
+        # objective, dominates a box up to the next one
+        front = front[np.lexsort((front[:, 1], front[:, 0]))]
+        best = np.minimum.accumulate(front[:, 1])
+        front = front[np.concatenate(([True], front[1:, 1] < best[:-1]))]
+        upper = np.column_stack(
+            (np.append(front[1:, 0], ref[0]), np.full(len(front), ref[1]))
+        )
+        return front, upper
+    if len(ref) == 3:
+        return _sweep_3d(front, ref)
+    bounds = np.concatenate((np.unique(front[:, -1]), [ref[-1]]))
+    lowers, uppers, n_boxes = [], [], 0
+    for k in range(len(bounds) - 1):
+        section = front[front[:, -1] <= bounds[k], :-1]
+        if len(ref) > 4:  # _sweep_3d ignores the dominated points itself
+            section = section[pareto_index(section)]
+        boxes = dominated_boxes(section, ref[:-1], max_boxes)
+        if boxes is None:
+            return None
+        lower, upper = boxes
+        lowers.append(np.hstack((lower, np.full((len(lower), 1), bounds[k]))))
+        uppers.append(np.hstack((upper, np.full((len(upper), 1), bounds[k + 1]))))
+        n_boxes += len(lower)
+        if max_boxes is not None and n_boxes > 2 * max_boxes:
+            # merged so far, to abandon as soon as there are too many boxes
+            lower, upper = _merge_slices(np.vstack(lowers), np.vstack(uppers))
+            if len(lower) > max_boxes:
+                return None
+            lowers, uppers, n_boxes = [lower], [upper], len(lower)
+    lower, upper = _merge_slices(np.vstack(lowers), np.vstack(uppers))
+    if max_boxes is not None and len(lower) > max_boxes:
+        return None
+    return lower, upper
+
+
+def _sweep_3d(front, ref):
+    """
+    dominated_boxes of 3 objectives, without recursion : the staircases of
+    all the slices along the third objective are computed at once.
+    """
+    front = front[np.lexsort((front[:, 2], front[:, 1], front[:, 0]))]
+    bounds = np.concatenate((np.unique(front[:, 2]), [ref[2]]))
+    n_slices, n = len(bounds) - 1, len(front)
+    k = np.arange(n_slices)[:, None]
+    enter = np.searchsorted(bounds, front[:, 2])
+    # j leaves the staircases once a point before it along the first
+    # objective and not above it along the second one has entered
+    hides = np.triu(front[:, None, 1] <= front[None, :, 1], 1)
+    leave = np.min(np.where(hides, enter[:, None], n_slices), axis=0)
+    alive = (enter <= k) & (k < leave)  # [n_slices, n]
+    # the box of j in a slice goes up to the next alive point
+    nxt = np.where(alive, np.arange(n), n)
+    nxt = np.minimum.accumulate(nxt[:, ::-1], axis=1)[:, ::-1]
+    nxt = np.hstack((nxt[:, 1:], np.full((n_slices, 1), n)))
+    top = np.append(front[:, 0], ref[0])[nxt]
+    # one merged box from each slice where the box of j appears or changes
+    start = alive.copy()
+    start[1:] &= ~(alive[:-1] & (top[1:] == top[:-1]))
+    stop = np.where(start | ~alive, k, n_slices)
+    end = np.minimum.accumulate(stop[::-1], axis=0)[::-1]
+    end = np.vstack((end[1:], np.full((1, n), n_slices)))
+    ks, js = np.nonzero(start)
+    lower = np.column_stack((front[js, :2], bounds[ks]))
+    upper = np.column_stack(
+        (top[ks, js], np.full(len(ks), ref[1]), bounds[end[ks, js]])
+    )
+    return lower, upper
+
+
+def _merge_slices(lower, upper):
+    """
+    Merges the boxes which have the same bounds except along the last
+    objective, where they are contiguous.
+    """
+    section = np.hstack((lower[:, :-1], upper[:, :-1]))
+    order = np.lexsort(np.vstack((lower[:, -1], section.T[::-1])))
+    section, lower, upper = section[order], lower[order], upper[order]
+    follows = np.all(section[1:] == section[:-1], axis=1) & (
+        lower[1:, -1] == upper[:-1, -1]
+    )
+    first = np.concatenate(([True], ~follows))  # first box of each merged box
+    last = np.concatenate((~follows, [True]))
+    top = upper[last, -1]
+    lower, upper = lower[first], upper[first]
+    upper[:, -1] = top
+    return lower, upper
+
+
+def hypervolume_improvement(Y, lower, upper, ref, max_size=2 ** 22):
+    """
+    Hypervolume improvement of each point of Y taken alone : the volume between
+    y and ref minus its intersection with the dominated boxes.
+
+    Parameters
+    ----------
+    Y : ndarray[n, n_obj]
+        points to evaluate.
+    lower, upper : ndarray[n_boxes, n_obj]
+        see dominated_boxes.
+    ref : array-like[n_obj]
+        reference point.
+    max_size : int, optional
+        maximal number of elements of the intermediate arrays, the points are
+        processed by blocks to bound the memory. The default is 2 ** 22.
+
+    Returns
+    -------
+    ndarray[n]
+        improvement of each point.
+    """
+    Y = np.asarray(Y, dtype=float)
+    hvi = np.prod(np.maximum(np.asarray(ref) - Y, 0), axis=1)
+    block = max(1, max_size // max(1, lower.size))
+    for start in range(0, len(Y), block):
+        y = Y[start : start + block, None, :]
+        inter = np.prod(np.maximum(upper - np.maximum(y, lower), 0), axis=2)
+        hvi[start : start + block] -= inter.sum(axis=1)
+    return np.maximum(hvi, 0)
+
+
+def hypervolume_improvement_front(Y, front, ref, max_boxes=None):
+    """
+    Hypervolume improvement of each point of Y taken alone, without the
+    decomposition of the whole dominated region, used when it has too many
+    boxes. The points are processed by blocks : the improvement of the points
+    of a block only depends on the region dominated by the front above their
+    lowest corner, which is the one of the front limited to this corner, and
+    whose decomposition is smaller. A block whose decomposition has more than
+    max_boxes boxes is split in two along the objective where its points are
+    the most spread, down to single points whose decomposition is not bounded.
+    Close points share a decomposition, but scattered points can cost up to
+    one decomposition each, plus the abandoned ones of their blocks. For 60
+    points of a spherical front of 5 objectives, the decomposition of one
+    point takes about 40 ms, and 2000 Monte-Carlo samples around 4 points
+    take 7 ms each with max_boxes = 800, while a hypervolume of pymoo takes
+    170 ms.
+
+    Parameters
+    ----------
+    Y : ndarray[n, n_obj]
+        points to evaluate.
+    front : ndarray[n_pf, n_obj]
+        Pareto front.
+    ref : array-like[n_obj]
+        reference point.
+    max_boxes : int, optional
+        maximal number of boxes of the decomposition of a block of several
+        points. The default is None, one block for all the points.
+
+    Returns
+    -------
+    ndarray[n]
+        improvement of each point.
+    """
+    Y = np.asarray(Y, dtype=float)
+    ref = np.asarray(ref, dtype=float)
+    hvi = np.zeros(len(Y))
+    blocks = [np.flatnonzero(np.all(Y < ref, axis=1))]  # the others improve nothing
+    while blocks:
+        block = blocks.pop()
+        if len(block) == 0:
+            continue
+        corner = Y[block].min(axis=0)
+        limited = np.maximum(front, corner)
+        boxes = dominated_boxes(
+            limited[pareto_index(limited)],
+            ref,
+            max_boxes if len(block) > 1 else None,
+        )
+        if boxes is None:
+            spread = np.ptp(Y[block], axis=0) / (ref - corner)
+            block = block[np.argsort(Y[block, np.argmax(spread)], kind="stable")]
+            blocks += [block[: len(block) // 2], block[len(block) // 2 :]]
+        else:
+            hvi[block] = hypervolume_improvement(Y[block], *boxes, ref)
+    return hvi
+
+
+def expected_improvement_boxes(mean, sigma, lower, upper, max_size=2 ** 22):
+    """
+    Expected hypervolume improvement of independent gaussian points, given the
+    box decomposition of the non-dominated region. The improvement in a box
+    [l, u] is the volume of the part of the box dominated by y, which is the
+    product over the objectives of (u - max(y, l))+, whose expectations are
+    known in closed form.
+
+    Parameters
+    ----------
+    mean : ndarray[n, n_obj]
+        means of the points.
+    sigma : ndarray[n, n_obj]
+        standard deviations of the points, strictly positive.
+    lower, upper : ndarray[n_boxes, n_obj]
+        see nondominated_boxes.
+    max_size : int, optional
+        maximal number of elements of the intermediate arrays, the points are
+        processed by blocks to bound the memory. The default is 2 ** 22.
+
+    Returns
+    -------
+    ndarray[n]
+        EHVI of each point.
+    """
+    finite = np.isfinite(lower)
+    low = np.where(finite, lower, 0)
+    ehvi = np.zeros(len(mean))
+    block = max(1, max_size // max(1, lower.size))
+    for start in range(0, len(mean), block):
+        moy = mean[start : start + block, None, :]
+        sig = sigma[start : start + block, None, :]
+        a_u = (upper - moy) / sig
+        a_l = np.where(finite, (low - moy) / sig, -np.inf)
+        cdf_u, cdf_l = norm.cdf(a_u), norm.cdf(a_l)
+        expected = (
+            (upper - moy) * (cdf_u - cdf_l)
+            + sig * (norm.pdf(a_u) - norm.pdf(a_l))
+            + np.where(finite, (upper - low) * cdf_l, 0)
+        )
+        ehvi[start : start + block] = np.prod(expected, axis=2).sum(axis=1)
+    return ehvi
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Update of trained smt kriging models with new points, without optimizing
+their hyperparameters again.
+"""
+
+import copy
+
+import numpy as np
+from scipy import linalg
+from smt.utils.kriging_utils import differences
+
+
+def append_points(model, x, y):
+    """
+    Adds training points to a trained model, keeping its hyperparameters and
+    the normalization of its inputs and outputs. The Cholesky factor of the
+    correlation matrix is extended by the rows of the new points, which costs
+    O(nt² m) for m new points instead of O(nt³) for a new factorization.
+
+    Parameters
+    ----------
+    model : smt KRG or KPLS
+        trained model, not modified.
+    x : ndarray[m, n_dim]
+        new inputs.
+    y : ndarray[m] or ndarray[m, ny]
+        new outputs.
+
+    Returns
+    -------
+    smt KRG or KPLS
+        updated copy of model, or None if the model is not supported or if
+        the new correlation matrix is not positive definite.
+    """
+    if (
+        model.options["eval_noise"]
+        or model.options["categorical_kernel"] is not None
+        or "C" not in getattr(model, "optimal_par", {})
+    ):
+        return None
+    x = np.atleast_2d(np.asarray(x, dtype=float))
+    y = np.reshape(np.asarray(y, dtype=float), (len(x), -1))
+    par = model.optimal_par
+    corr = model._correlation_types[model.options["corr"]]
+    regr = model._regression_types[model.options["poly"]]
+    x_norma = (x - model.X_offset) / model.X_scale
+    y_norma = (y - model.y_mean) / model.y_std
+
+    # new rows of the Cholesky factor [[C, 0], [L21, L22]]
+    d = model._componentwise_distance(differences(x_norma, Y=model.X_norma.copy()))
+    r12 = corr(model.optimal_theta, d).reshape(len(x), model.nt)
+    d = model._componentwise_distance(differences(x_norma, Y=x_norma.copy()))
+    r22 = corr(model.optimal_theta, d).reshape(len(x), len(x))
+    r22[np.diag_indices(len(x))] = (
+        1.0 + model.options["nugget"] + np.max(model.optimal_noise)
+    )
+    L21 = linalg.solve_triangular(par["C"], r12.T, lower=True).T
+    try:
+        L22 = linalg.cholesky(r22 - np.dot(L21, L21.T), lower=True)
+    except (linalg.LinAlgError, ValueError):
+        return None
+    C = np.block([[par["C"], np.zeros((model.nt, len(x)))], [L21, L22]])
+
+    # the solves by C of the old rows are unchanged
+    Yt = np.dot(par["C"].T, par["gamma"]) + np.dot(par["Ft"], par["beta"])
+    Ft_new = linalg.solve_triangular(
+        L22, regr(x_norma) - np.dot(L21, par["Ft"]), lower=True
+    )
+    Yt_new = linalg.solve_triangular(L22, y_norma - np.dot(L21, Yt), lower=True)
+    Ft = np.vstack((par["Ft"], Ft_new))
+    Yt = np.vstack((Yt, Yt_new))
+    Q, G = linalg.qr(Ft, mode="economic")
+    beta = linalg.solve_triangular(G, np.dot(Q.T, Yt))
+    rho = Yt - np.dot(Ft, beta)
+    nt = model.nt + len(x)
+
+    new = copy.copy(model)
+    new.nt = nt
+    new.X_norma = np.vstack((model.X_norma, x_norma))
+    new.y_norma = np.vstack((model.y_norma, y_norma))
+    new.F = np.vstack((model.F, regr(x_norma)))
+    xt, yt = model.training_points[None][0]
+    new.training_points = copy.copy(model.training_points)
+    new.training_points[None] = {
+        0: [np.vstack((xt, x)), np.vstack((np.reshape(yt, (len(xt), -1)), y))]
+    }
+    new.optimal_par = {
+        "sigma2": (rho ** 2.0).sum(axis=0) / nt * model.y_std ** 2.0,
+        "beta": beta,
+        "gamma": linalg.solve_triangular(C.T, rho),
+        "C": C,
+        "Ft": Ft,
+        "G": G,
+        "Q": Q,
+    }
+    return new
+
+
+def loo_error(model):
+    """
+    Mean squared leave-one-out error of a trained model on its normalized
+    outputs, in closed form with the hyperparameters and the trend fixed :
+    the error at the i-th point is [R^-1 (y - F beta)]_i / [R^-1]_ii.
+
+    Parameters
+    ----------
+    model : smt KRG or KPLS
+        trained model.
+
+    Returns
+    -------
+    float
+        leave-one-out error, averaged over the outputs.
+    """
+    par = model.optimal_par
+    C_inv = linalg.solve_triangular(par["C"], np.eye(model.nt), lower=True)
+    errors = par["gamma"] / (C_inv ** 2).sum(axis=0)[:, None]
+    return float(np.mean(errors ** 2))
+
+
+def train_fixed(model, xt, yt, theta):
+    """
+    Trains a model with given hyperparameters instead of optimizing them.
+
+    Parameters
+    ----------
+    model : smt KRG or KPLS
+        untrained model.
+    xt, yt : ndarray
+        training points.
+    theta : ndarray
+        hyperparameters, optimal_theta of a model of the same type.
+
+    Returns
+    -------
+    smt KRG or KPLS
+        trained model.
+    """
+    theta = np.array(theta, dtype=float)
+
+    def _optimize_hyperparam(D):
+        model.noise0 = np.array(model.options["noise0"])
+        model.D = model._componentwise_distance(D)
+        value, par = model._reduced_likelihood_function(theta)
+        return value, par, theta
+
+    model._optimize_hyperparam = _optimize_hyperparam
+    try:
+        model.set_training_values(xt, yt)
+        model.train()
+    finally:
+        del model._optimize_hyperparam
+    return model
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Timers and counters of the phases of a MOO run.
+"""
+
+import json
+import time
+
+
+class Instrumentation(object):
+    """
+    Measures of a MOO run, given as its instrumentation option. Each measure
+    is an event, a dictionnary with :
+        "name" : the measured phase, such as "doe", "modelize",
+        "acquisition", "criterion.PI", "generation", "prediction" or "final",
+        "time" : its duration in seconds, None for a counter,
+        "count" : the number of counted items, such as evaluated points,
+        "wall" : the end of the measure, as given by time.time(),
+    and the information given by MOO, such as "iter". The events are kept,
+    given to the listeners, and totalized by name in timers and counters.
+    """
+
+    def __init__(self, listeners=()):
+        """
+        Parameters
+        ----------
+        listeners : list of function, optional
+            functions called with each event. The default is ().
+        """
+        self.listeners = list(listeners)
+        self.events = []
+        self.timers = {}
+        self.counters = {}
+        self._exported = 0  # number of events already exported
+
+    def add_listener(self, listener):
+        """
+        Parameters
+        ----------
+        listener : function
+            function called with each new event.
+        """
+        self.listeners.append(listener)
+
+    def timer(self, name, **info):
+        """
+        Context manager measuring the duration of its block as an event.
+
+        Parameters
+        ----------
+        name : str
+            name of the event.
+        **info :
+            other items of the event, "count" being 1 by default.
+        """
+        return _Timing(self, name, info)
+
+    def timed(self, fun, name, **info):
+        """
+        Returns
+        -------
+        function
+            fun whose calls are measured as events.
+        """
+
+        def timed_fun(*args, **kwargs):
+            with self.timer(name, **info):
+                return fun(*args, **kwargs)
+
+        return timed_fun
+
+    def count(self, name, count=1, **info):
+        """
+        Counts items as an event, without duration.
+        """
+        self.emit(dict(info, name=name, time=None, count=count, wall=time.time()))
+
+    def emit(self, event):
+        """
+        Records an event and gives it to the listeners.
+        """
+        self.events.append(event)
+        name = event["name"]
+        self.counters[name] = self.counters.get(name, 0) + event["count"]
+        if event["time"] is not None:
+            n_calls, total = self.timers.get(name, (0, 0.0))
+            self.timers[name] = (n_calls + 1, total + event["time"])
+        for listener in self.listeners:
+            listener(event)
+
+    def summary(self):
+        """
+        Returns
+        -------
+        dictionnary
+            for each name, "count" : its number of counted items, and for
+            the timed ones, "calls" : the number of measures, "time" : their
+            total duration and "mean" : their mean duration.
+        """
+        res = {name: {"count": count} for name, count in self.counters.items()}
+        for name, (n_calls, total) in self.timers.items():
+            res[name].update(calls=n_calls, time=total, mean=total / n_calls)
+        return res
+
+    def export(self, path):
+        """
+        Appends the events to the JSON lines file path, one event per line.
+        Only the events which were not exported yet are written, so that it
+        can be called after each run without duplicating the former events.
+        """
+        with open(path, "a") as fichier:
+            for event in self.events[self._exported :]:
+                fichier.write(json.dumps(event, default=_to_json) + "\n")
+        self._exported = len(self.events)
+
+    def reset(self):
+        """
+        Forgets the events, the listeners being kept.
+        """
+        self.events = []
+        self.timers = {}
+        self.counters = {}
+        self._exported = 0
+
+
+class _Timing(object):
+    def __init__(self, instrumentation, name, info):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.info = info
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.start
+        event = dict(self.info, name=self.name, time=duration, wall=time.time())
+        event.setdefault("count", 1)
+        self.instrumentation.emit(event)
+        return False
+
+
+def _to_json(value):
+    """
+    numpy scalars and arrays of the events
+    """
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
@@ -6,11 +6,93 @@ Created on Mon May  3 14:38:58 2021
 """
 
 import numpy as np
+from scipy.stats import norm, qmc
 
 
 class MonteCarlo(object):
-    def __init__(self, random_state=None):
+    def __init__(self, random_state=None, method="random"):
+        """
+        Parameters
+        ----------
+        random_state : int, optional
+            seed of the draws. The default is None.
+        method : str, optional
+            "random" for pseudo-random normal draws, "sobol" for a scrambled
+            Sobol' sequence or "lhs" for a latin hypercube, mapped to normal
+            draws through the inverse cumulative distribution. The default is "random".
+        """
         self.seed = np.random.RandomState(random_state)
+        self.random_state = random_state
+        self.method = method
+        self._draws = {}
+
+    def draws(self, points, n_obj):
+        """
+        Standard normal base samples ndarray[points, n_obj]. They are drawn once
+        and reused for every design point and every call (common random numbers),
+        so that the estimations are smooth functions of the means and variances.
+        """
+        if (points, n_obj) not in self._draws:
+            if self.method == "random":
+                z = self.seed.standard_normal((points, n_obj))
+            else:
+                if self.method == "sobol":
+                    engine = qmc.Sobol(n_obj, scramble=True, seed=self.random_state)
+                    u = engine.random_base2(int(np.ceil(np.log2(points))))[:points]
+                else:
+                    engine = qmc.LatinHypercube(n_obj, seed=self.random_state)
+                    u = engine.random(points)
+                eps = np.finfo(float).eps
+                z = norm.ppf(np.clip(u, eps, 1 - eps))
+            self._draws[(points, n_obj)] = z
+        return self._draws[(points, n_obj)]
+
+    def estimate(self, moyennes, sigmas, func, points=300, tol=None, batch=None):
+        """
+        Monte-Carlo estimation of the expectation of func for independent
+        gaussian outputs. Without tol, all the points are used. With tol,
+        the samples are taken by batches, until the standard error of the
+        estimation is lower than tol or points samples have been used.
+
+        Parameters
+        ----------
+        moyennes : ndarray[n, n_obj]
+            means of the outputs.
+        sigmas : ndarray[n, n_obj]
+            standard deviations of the outputs.
+        func : function
+            ndarray[n, n_samples, n_obj] -> ndarray[n, n_samples], the quantity to average.
+        points : int, optional
+            (maximal) number of samples. The default is 300.
+        tol : float, optional
+            target standard error. The default is None.
+        batch : int, optional
+            number of samples of each batch with tol. The default is points // 10.
+
+        Returns
+        -------
+        ndarray[n]
+            estimated expectations.
+        """
+        z = self.draws(points, moyennes.shape[1])
+        if tol is None:
+            return func(moyennes[:, None, :] + sigmas[:, None, :] * z).mean(axis=1)
+        batch = batch or max(points // 10, 1)
+        n = moyennes.shape[0]
+        total, total2, count = np.zeros(n), np.zeros(n), np.zeros(n)
+        active = np.arange(n)
+        for start in range(0, points, batch):
+            zb = z[start : start + batch]
+            values = func(moyennes[active, None, :] + sigmas[active, None, :] * zb)
+            total[active] += values.sum(axis=1)
+            total2[active] += (values ** 2).sum(axis=1)
+            count[active] += len(zb)
+            mean = total[active] / count[active]
+            variance = np.maximum(total2[active] / count[active] - mean ** 2, 0)
+            active = active[np.sqrt(variance / count[active]) >= tol]
+            if len(active) == 0:
+                break
+        return total / count
 
     def sampling(self, x, distrib, points=300):
         """
@@ -20,8 +102,8 @@ class MonteCarlo(object):
 
         Parameters
         ----------
-        x : ndarray[n_dim]
-            Design point to evaluate thanks to a criteria after the sampling.
+        x : ndarray[n_dim] or ndarray[n, n_dim]
+            Design point(s) to evaluate thanks to a criteria after the sampling.
         distrib : list of smt models
             models of the objective.
         points : int, optional
@@ -29,12 +111,18 @@ class MonteCarlo(object):
 
         Returns
         -------
-        ndarray[points, n_obj]
-            point's distribution in the objective space according to the model(s).
+        ndarray[points, n_obj] or ndarray[n, points, n_obj]
+            point's distribution in the objective space according to the model(s),
+            the first shape for a single design point. The same normal draws
+            are used for every design point of x.
 
         """
-        moyennes = np.asarray([model.predict_values(x)[0][0] for model in distrib])
-        sigmas = np.asarray(
-            [model.predict_variances(x)[0][0] ** 0.5 for model in distrib]
+        single = np.ndim(x) == 1 or np.shape(x)[0] == 1
+        x = np.atleast_2d(x)
+        moyennes = np.hstack([model.predict_values(x) for model in distrib])
+        sigmas = np.sqrt(
+            np.maximum(np.hstack([model.predict_variances(x) for model in distrib]), 0)
         )
-        return self.seed.normal(moyennes, sigmas, (points, len(distrib)))
+        draws = self.draws(points, len(distrib))
+        samples = moyennes[:, None, :] + sigmas[:, None, :] * draws
+        return samples[0] if single else samples
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Prediction layer shared by the criteria, the penalization and the logs.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+from scipy import linalg
+from smt.utils.kriging_utils import differences
+
+
+class Predictor(object):
+    """
+    Wraps a trained smt kriging model. The mean and the variance at a batch of
+    points share one computation of the correlation with the training points,
+    and the last batches are kept in a small cache, so that predicting the
+    same batch again costs nothing. The other attributes are the ones of the model.
+    """
+
+    def __init__(self, model, cache_size=8, instrumentation=None):
+        """
+        Parameters
+        ----------
+        model : smt surrogate model
+            trained model.
+        cache_size : int, optional
+            number of batches kept in the cache. The default is 8.
+        instrumentation : Instrumentation, optional
+            if given, the points predicted out of the cache are counted in
+            its "prediction" events. The default is None.
+        """
+        self.model = model
+        self.cache_size = cache_size
+        self.instrumentation = instrumentation
+        self._cache = OrderedDict()
+        self._fused = (
+            hasattr(model, "optimal_par")
+            and "C" in model.optimal_par
+            and model.options._dict.get("categorical_kernel") is None
+        )
+
+    def __getattr__(self, name):
+        if name == "model":  # not set yet
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def _entry(self, x):
+        x = np.ascontiguousarray(np.atleast_2d(x), dtype=float)
+        key = (x.shape, x.tobytes())
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key], x
+        entry = {}
+        self._cache[key] = entry
+        if self.instrumentation is not None:
+            self.instrumentation.count("prediction", len(x))
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return entry, x
+
+    def predict_values(self, x):
+        """
+        Parameters
+        ----------
+        x : ndarray[n, n_dim]
+            prediction points.
+
+        Returns
+        -------
+        ndarray[n, ny]
+            means of the model, read-only.
+        """
+        entry, x = self._entry(x)
+        if "mean" not in entry:
+            if self._fused:
+                self._correlation(entry, x)
+                mod = self.model
+                y = np.dot(entry["f"], mod.optimal_par["beta"]) + np.dot(
+                    entry["r"], mod.optimal_par["gamma"]
+                )
+                entry["mean"] = (mod.y_mean + mod.y_std * y).reshape(len(x), -1)
+            else:
+                entry["mean"] = self.model.predict_values(x)
+            entry["mean"].flags.writeable = False
+        return entry["mean"]
+
+    def predict_variances(self, x):
+        """
+        Parameters
+        ----------
+        x : ndarray[n, n_dim]
+            prediction points.
+
+        Returns
+        -------
+        ndarray[n, ny]
+            variances of the model, read-only.
+        """
+        entry, x = self._entry(x)
+        if "var" not in entry:
+            if self._fused:
+                self._correlation(entry, x)
+                par = self.model.optimal_par
+                rt = linalg.solve_triangular(par["C"], entry["r"].T, lower=True)
+                # smt computes this regression term on the unscaled points
+                f = self.model._regression_types[self.model.options["poly"]](x)
+                u = linalg.solve_triangular(
+                    par["G"].T, np.dot(par["Ft"].T, rt) - f.T
+                )
+                B = 1.0 - (rt ** 2.0).sum(axis=0) + (u ** 2.0).sum(axis=0)
+                var = np.einsum("i,j -> ji", par["sigma2"], B)
+                var[var < 0.0] = 0.0
+                entry["var"] = var.reshape(len(x), -1)
+            else:
+                entry["var"] = self.model.predict_variances(x)
+            entry["var"].flags.writeable = False
+        return entry["var"]
+
+    def predict(self, x):
+        """
+        Returns
+        -------
+        ndarray[n, ny], ndarray[n, ny]
+            means and variances of the model at x.
+        """
+        return self.predict_values(x), self.predict_variances(x)
+
+    def predict_gradients(self, x, output=0):
+        """
+        Gradients of the mean and of the variance, for models with a squared
+        exponential correlation and a constant regression term.
+
+        Parameters
+        ----------
+        x : ndarray[n, n_dim]
+            prediction points.
+        output : int, optional
+            index of the output. The default is 0.
+
+        Returns
+        -------
+        ndarray[n, n_dim], ndarray[n, n_dim]
+            gradients of the mean and of the variance, or None if the model
+            is not supported.
+        """
+        mod = self.model
+        if not (
+            self._fused
+            and mod.options["corr"] == "squar_exp"
+            and mod.options["poly"] == "constant"
+        ):
+            return None
+        entry, x = self._entry(x)
+        self._correlation(entry, x)
+        r = entry["r"]
+        n, nt, nx = len(x), mod.nt, x.shape[1]
+        if mod.name != "Kriging" and "KPLSK" not in mod.name:  # as smt
+            theta = np.sum(mod.optimal_theta * mod.coeff_pls ** 2, axis=1)
+        else:
+            theta = mod.optimal_theta
+        x_norma = (x - mod.X_offset) / mod.X_scale
+        # dr[i, j, k] : derivative of r[i, j] wrt the scaled x[i, k]
+        dr = -2 * theta * (x_norma[:, None, :] - mod.X_norma) * r[:, :, None]
+        par = mod.optimal_par
+        y_std = np.ravel(mod.y_std)[output]
+        dmean = np.einsum("ijk,j->ik", dr, par["gamma"][:, output])
+        dmean *= y_std / mod.X_scale
+
+        rt = linalg.solve_triangular(par["C"], r.T, lower=True)
+        drt = linalg.solve_triangular(
+            par["C"], dr.transpose(1, 0, 2).reshape(nt, n * nx), lower=True
+        ).reshape(nt, n, nx)
+        u = linalg.solve_triangular(par["G"].T, np.dot(par["Ft"].T, rt) - 1)
+        du = linalg.solve_triangular(
+            par["G"].T, np.dot(par["Ft"].T, drt.reshape(nt, n * nx))
+        ).reshape(-1, n, nx)
+        dB = -2 * np.einsum("ji,jik->ik", rt, drt) + 2 * np.einsum("ji,jik->ik", u, du)
+        dvar = par["sigma2"][output] * dB / mod.X_scale
+        var = self.predict_variances(x)
+        dvar[var[:, output] <= 0] = 0  # variance forced to 0
+        return dmean, dvar
+
+    def _correlation(self, entry, x):
+        """
+        Stores in entry the correlations between x and the training points,
+        and the regression terms, as in smt KrgBased._predict_values.
+        """
+        if "r" in entry:
+            return
+        mod = self.model
+        x_norma = (x - mod.X_offset) / mod.X_scale
+        d = mod._componentwise_distance(differences(x_norma, Y=mod.X_norma.copy()))
+        entry["r"] = mod._correlation_types[mod.options["corr"]](
+            mod.optimal_theta, d
+        ).reshape(len(x), mod.nt)
+        entry["f"] = mod._regression_types[mod.options["poly"]](x_norma)
+
+
+class OutputView(object):
+    """
+    One output of a multi-output Predictor, seen as a one output model.
+    The views of the same Predictor share its cache, so that predicting
+    all the outputs at the same points costs one prediction.
+    """
+
+    def __init__(self, predictor, output):
+        """
+        Parameters
+        ----------
+        predictor : Predictor
+            multi-output model.
+        output : int
+            index of the output.
+        """
+        self.predictor = predictor
+        self.output = output
+        xt, yt = predictor.training_points[None][0]
+        self.training_points = {None: {0: [xt, yt[:, output : output + 1]]}}
+
+    def __getattr__(self, name):
+        if name == "predictor":  # not set yet
+            raise AttributeError(name)
+        return getattr(self.predictor, name)
+
+    def predict_values(self, x):
+        """
+        Returns
+        -------
+        ndarray[n, 1]
+            means of the output at x, read-only.
+        """
+        return self.predictor.predict_values(x)[:, self.output : self.output + 1]
+
+    def predict_variances(self, x):
+        """
+        Returns
+        -------
+        ndarray[n, 1]
+            variances of the output at x, read-only.
+        """
+        return self.predictor.predict_variances(x)[:, self.output : self.output + 1]
+
+    def predict(self, x):
+        """
+        Returns
+        -------
+        ndarray[n, 1], ndarray[n, 1]
+            means and variances of the output at x.
+        """
+        return self.predict_values(x), self.predict_variances(x)
+
+    def predict_gradients(self, x):
+        """
+        See Predictor.predict_gradients.
+        """
+        return self.predictor.predict_gradients(x, self.output)
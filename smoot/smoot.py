@@ -5,18 +5,31 @@ Created on Wed Mar 31 14:08:54 2021
 @author: robin grapin
 """
 
+import os
+import time
+from contextlib import nullcontext
+from concurrent.futures import Executor, FIRST_COMPLETED, ProcessPoolExecutor, wait
+
 import numpy as np
+from scipy import optimize
 
 from pymoo.algorithms.moo.nsga2 import NSGA2
 from pymoo.core.problem import Problem, ElementwiseProblem
+from pymoo.core.result import Result
 from pymoo.optimize import minimize
 from pymoo.factory import get_performance_indicator
 
 from smt.applications.application import SurrogateBasedApplication
+from smt.applications.ego import Evaluator
 from smt.surrogate_models import KRG, KPLS
 from smt.sampling_methods import LHS
 
+from smoot.checkpoint import append_record, read_checkpoint
 from smoot.criterion import Criterion
+from smoot.distance import sum_of_distances
+from smoot.dominance import pareto_index
+from smoot.incremental import append_points, loo_error, train_fixed
+from smoot.predictor import Predictor, OutputView
 
 
 class MOO(SurrogateBasedApplication):
@@ -55,7 +68,7 @@ class MOO(SurrogateBasedApplication):
             "transfo",
             lambda l: sum(l),
             types=type(lambda x: x),
-            desc="transfo function for wb2s formula : s*subcrit - transfo(µ)",
+            desc="transfo function for wb2s formula : s*subcrit - transfo(µ), taking the list of the predicted objectives of one point and returning a float",
         )
         declare(
             "criterion",
@@ -79,6 +92,81 @@ class MOO(SurrogateBasedApplication):
             types=int,
             desc="number generations for the genetic algorithm",
         )
+        declare(
+            "vectorized",
+            True,
+            types=bool,
+            desc="True to evaluate the whole NSGA2 population at once with one prediction per model, False for one individual at a time",
+        )
+        declare(
+            "final_front",
+            "eager",
+            types=str,
+            values=["eager", "lazy", "skip"],
+            desc="final NSGA2 on the models, started from the evaluated non-dominated points : run by optimize (eager), run at the first access to .result or to the X and F returned by optimize (lazy), or not run (skip, .result is then the evaluated non-dominated points)",
+        )
+        declare(
+            "optimizer",
+            "NSGA2",
+            types=str,
+            values=["NSGA2", "L-BFGS-B"],
+            desc="optimizer of the infill criterion : NSGA2, or a latin hypercube pre-screening of pop_size points followed by a multi-start L-BFGS-B",
+        )
+        declare(
+            "n_restart",
+            5,
+            types=int,
+            desc="number of starting points of the L-BFGS-B optimizer",
+        )
+        declare(
+            "batch_size",
+            1,
+            types=int,
+            desc="number of points added at each iteration, evaluated together",
+        )
+        declare(
+            "batch_strategy",
+            "KB",
+            types=str,
+            values=["KB", "KBLB", "KBUB", "KBRand", "CLmin"],
+            desc="virtual outputs of the points of a batch before their evaluation : kriging believer (mean, mean -/+ 3 std or random), or constant liar (minimum of each output)",
+        )
+        declare(
+            "evaluator",
+            default=Evaluator(),
+            types=Evaluator,
+            desc="object running fun and the constraints at the points of a batch, (nsamples, nxdim)",
+        )
+        declare(
+            "executor",
+            None,
+            types=(type(None), Executor),
+            desc="if given, asynchronous mode : batch_size evaluations are kept running in the executor, the points being evaluated have virtual outputs, and a new point is submitted as soon as one evaluation ends",
+        )
+        declare(
+            "multi_output",
+            False,
+            types=bool,
+            desc="True to model all the objectives and constraints with one kriging model, sharing its hyperparameters and the factorization of its correlation matrix, False for one model per output",
+        )
+        declare(
+            "n_jobs",
+            1,
+            types=int,
+            desc="number of processes training the surrogates concurrently, in a pool created once for each run, 1 to train them one after another",
+        )
+        declare(
+            "retrain_every",
+            1,
+            types=int,
+            desc="number of new points after which the hyperparameters are optimized again, starting from their previous values. In between, the new points are added to the models with an update of their Cholesky factorization. 1 to optimize them at each update",
+        )
+        declare(
+            "loo_tol",
+            None,
+            types=(type(None), float),
+            desc="if given and retrain_every > 1, the hyperparameters of a model are also optimized again when its leave-one-out error exceeds (1 + loo_tol) times its value after the last optimization",
+        )
         declare(
             "q",
             0.5,
@@ -86,6 +174,42 @@ class MOO(SurrogateBasedApplication):
             desc="importance ratio of design space in comparation to objective space when chosing a point with GA",
         )
 
+        declare(
+            "mc_points",
+            None,
+            types=(type(None), int),
+            desc="(maximal) number of Monte-Carlo samples for PI and EHVI with many objectives, 100*ny if None",
+        )
+        declare(
+            "mc_sampling",
+            "random",
+            types=str,
+            values=["random", "sobol", "lhs"],
+            desc="normal draws of the Monte-Carlo samples : pseudo-random, scrambled Sobol' or latin hypercube",
+        )
+        declare(
+            "mc_tol",
+            None,
+            types=(type(None), float),
+            desc="if given, Monte-Carlo samples are added by batches until the standard error is below mc_tol",
+        )
+
+        declare(
+            "checkpoint",
+            None,
+            types=(type(None), str),
+            desc="file where the new evaluated points, the hyperparameters, the last trained models kept with retrain_every > 1 and the random state are appended at each update of the models. If it exists, optimize resumes from it without new evaluations nor hyperparameters optimization, the models being then retrained at the same updates as without interruption",
+        )
+        declare(
+            "callback",
+            None,
+            desc="function called with the state of the optimization after each update of the models, see MOO.iterate",
+        )
+        declare(
+            "instrumentation",
+            None,
+            desc="Instrumentation object measuring the doe evaluation, the trainings of the models, the predictions out of their cache, the calls of the criteria, the NSGA2 generations and the final NSGA2, see smoot.instrumentation. None to measure nothing",
+        )
         declare("verbose", False, types=bool, desc="Print computation information")
         declare(
             "xdoe",
@@ -108,15 +232,13 @@ class MOO(SurrogateBasedApplication):
         """
         Optimize the multi-objective function fun. At the end, the object's item
         .modeles is a SMT surrogate_model object with the most precise fun's model
-        .result is the result of its optimization thanks to NSGA2
+        .result is the result of its optimization thanks to NSGA2,
+        see the final_front option
 
         Parameters
         ----------
         fun : function
-            function taking x=ndarray[ne,ndim],
-            returning y = ndarray[ne,ny]
-            where y[i][j] = fj(xi).
-            If fun has only one objective, y = ndarray[ne, 1]
+            see iterate.
 
         Returns
         -------
@@ -124,6 +246,71 @@ class MOO(SurrogateBasedApplication):
             Pareto Set.
         self.result.F : ndarray[int,ny]
             Pareto Front.
+        If final_front is "lazy", a LazyResult which unpacks the same way,
+        the NSGA2 being run only when X or F is used.
+        """
+        for _ in self.iterate(fun):
+            pass
+        if self.ny == 1:  # EGO
+            return
+
+        if self.options["final_front"] == "lazy":
+            self._lazy_result = True
+            return LazyResult(self)
+        if self.options["final_front"] == "skip":
+            self.result = Result()
+            self.result.X, self.result.F = self._pareto_set, self._pareto_front
+            return self.result.X, self.result.F
+        self.log("Model is well refined, NSGA2 is running...")
+        self.compute_result()
+        self.log(
+            "Optimization done, get the front with .result.F and the set with .result.X"
+        )
+        return self.result.X, self.result.F
+
+    def iterate(self, fun):
+        """
+        Generator running the enrichment of the models, without the final
+        NSGA2 of optimize. After the initial models and after each update
+        of the models, it yields the state of the optimization, also given
+        to the callback option, as a dictionnary :
+            "iter" : number of the update, 0 for the initial doe,
+            "x", "y", "y_c" : the points evaluated for this update,
+            "x_data", "y_data", "y_data_c" : all the evaluated points,
+            "pareto_set", "pareto_front" : the non-dominated feasible
+            evaluated points,
+            "models", "const_models" : the current models.
+        With one objective, EGO is run and nothing is yielded.
+
+        Parameters
+        ----------
+        fun : function
+            function taking x=ndarray[ne,ndim],
+            returning y = ndarray[ne,ny]
+            where y[i][j] = fj(xi).
+            If fun has only one objective, y = ndarray[ne, 1]
+            With batch_size > 1, it is called by the evaluator
+            on the batch_size points of each iteration at once.
+
+        Yields
+        ------
+        dictionnary
+            state of the optimization.
+        """
+        # one pool for all the trainings of the run, see modelize
+        self._pool = None
+        if self.options["n_jobs"] > 1:
+            self._pool = ProcessPoolExecutor(self.options["n_jobs"])
+        try:
+            yield from self._iterate(fun)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+            self._pool = None
+
+    def _iterate(self, fun):
+        """
+        Enrichment of iterate, run with the process pool of the run
         """
         if type(self.options["xlimits"]) != np.ndarray:
             try:
@@ -133,8 +320,22 @@ class MOO(SurrogateBasedApplication):
                 return
 
         self.seed = np.random.RandomState(self.options["random_state"])
+        self._last_trained = []
+        self._evaluator = self.options["evaluator"]
         self.n_const = len(self.options["const"])
-        x_data, y_data, y_data_c = self._setup_optimizer(fun)
+        path = self.options["checkpoint"]
+        records = []
+        if path is not None and os.path.isfile(path):
+            records = read_checkpoint(path, repair=True)
+        if len(records) > 0:
+            self.log("resuming from " + path)
+            x_data = np.vstack([rec["x"] for rec in records])
+            y_data = np.vstack([rec["y"] for rec in records])
+            y_data_c = None
+            if self.n_const > 0:
+                y_data_c = np.vstack([rec["y_c"] for rec in records])
+        else:
+            x_data, y_data, y_data_c = self._setup_optimizer(fun)
         self.ndim = self.options["xlimits"].shape[0]
         self.ny = y_data.shape[-1]
 
@@ -143,65 +344,169 @@ class MOO(SurrogateBasedApplication):
             if self.n_const > 0:
                 self.log("EGO doesn't take constraints in account")
             self.use_ego(fun, x_data, y_data)
-            self.log(
-                "Optimization done, get the front with .result.F and the set with .result.X"
-            )
             return
 
         # obtaining models for each objective
-        self.modelize(x_data, y_data, y_data_c)
+        if len(records) > 0:
+            self.seed.set_state(records[-1]["rng"])
+            if records[-1].get("trained") is not None:
+                self._restore_last_trained(
+                    x_data,
+                    y_data,
+                    y_data_c,
+                    records[-1]["trained"],
+                    records[-1]["theta"],
+                )
+            self.modelize(x_data, y_data, y_data_c, theta=records[-1]["theta"])
+            n_evaluated = len(x_data) - len(records[0]["x"])
+        else:
+            self.modelize(x_data, y_data, y_data_c)
+            self._write_checkpoint(x_data, y_data, y_data_c)
+            n_evaluated = 0
+        k_start = n_evaluated // self.options["batch_size"]
+        yield self._state(k_start, x_data, y_data, y_data_c, x_data, y_data, y_data_c)
 
         if type(y_data) != list:
             y_data = list(y_data)
 
-        for k in range(self.options["n_iter"]):
+        if self.options["executor"] is not None:
+            yield from self._optimize_async(fun, x_data, y_data, y_data_c, n_evaluated)
+        else:
+            for k in range(k_start, self.options["n_iter"]):
 
-            self.log(str("iteration " + str(k + 1)))
+                self.log(str("iteration " + str(k + 1)))
 
-            # find next best x-coord point to evaluate
-            new_x, _ = self._find_best_point(self.options["criterion"])
-            new_x = np.array([new_x])
-            new_y = fun(new_x)
+                # find the next points to evaluate, the models being temporarily
+                # updated with virtual outputs between two points of the batch
+                new_x = []
+                x_virt, y_virt, y_virt_c = x_data, y_data, y_data_c
+                for p in range(self.options["batch_size"]):
+                    if p > 0:
+                        x_virt, y_virt, y_virt_c = self._add_virtual_points(
+                            np.atleast_2d(new_x[-1]), x_virt, y_virt, y_virt_c
+                        )
+                        self.modelize(
+                            x_virt, y_virt, y_virt_c, len(x_virt) - len(x_data)
+                        )
+                    with self._timer("acquisition", iter=k + 1):
+                        x_et, _ = self._find_best_point(self.options["criterion"])
+                    new_x.append(x_et)
+                new_x = np.atleast_2d(np.array(new_x))
+                with self._timer("evaluation", iter=k + 1, count=len(new_x)):
+                    new_y = self._evaluator.run(fun, new_x)
+                    new_y_c = self._eval_const(new_x) if self.n_const > 0 else None
 
-            # update model with the new point
-            y_data = np.atleast_2d(np.append(y_data, new_y, axis=0))
-            x_data = np.atleast_2d(np.append(x_data, new_x, axis=0))
+                # update model with the new points
+                y_data = np.atleast_2d(np.append(y_data, new_y, axis=0))
+                x_data = np.atleast_2d(np.append(x_data, new_x, axis=0))
 
-            # update the constraints
-            if self.n_const > 0:
-                new_y_c = np.atleast_2d(
-                    np.array(
-                        [
-                            self.options["const"][i](new_x)[0]
-                            for i in range(self.n_const)
-                        ]
-                    )
+                # update the constraints
+                if self.n_const > 0:
+                    y_data_c = np.atleast_2d(np.append(y_data_c, new_y_c, axis=0))
+
+                self.modelize(x_data, y_data, y_data_c)
+                self._write_checkpoint(new_x, new_y, new_y_c)
+                yield self._state(
+                    k + 1, new_x, new_y, new_y_c, x_data, y_data, y_data_c
                 )
-                y_data_c = np.atleast_2d(np.append(y_data_c, new_y_c, axis=0))
 
-            self.modelize(x_data, y_data, y_data_c)
+    @property
+    def result(self):
+        """
+        pymoo result of the final NSGA2, .X being the Pareto set and .F the
+        Pareto front, computed here with final_front = "lazy".
+        """
+        if getattr(self, "_lazy_result", False):
+            self.compute_result()
+        return self._result
 
-        self.log("Model is well refined, NSGA2 is running...")
-        self.result = minimize(
-            self.def_prob(
-                n_var=self.ndim,
-                xbounds=self.options["xlimits"],
-                n_obj=self.ny,
-                obj=self.modeles,
-                n_const=self.n_const,
-                const=self.const_modeles,
-            ),
-            NSGA2(
-                pop_size=2 * self.options["pop_size"], seed=self.options["random_state"]
-            ),
-            ("n_gen", 2 * self.options["n_gen"]),
-            seed=self.options["random_state"],
-        )
-        self.log(
-            "Optimization done, get the front with .result.F and the set with .result.X"
-        )
+    @result.setter
+    def result(self, result):
+        self._result = result
+        self._lazy_result = False
+
+    def compute_result(self):
+        """
+        Optimizes the current models with NSGA2, see optimize. The whole
+        population is predicted at once, and the initial population contains
+        the evaluated non-dominated points.
+
+        Returns
+        -------
+        self.result.X : ndarray[int,n_var]
+            Pareto Set.
+        self.result.F : ndarray[int,ny]
+            Pareto Front.
+        """
+        pop_size = 2 * self.options["pop_size"]
+        with self._timer("final"):
+            self.result = minimize(
+                self.def_prob(
+                    n_var=self.ndim,
+                    xbounds=self.options["xlimits"],
+                    n_obj=self.ny,
+                    obj=self.modeles,
+                    n_const=self.n_const,
+                    const=self.const_modeles,
+                    vectorized=True,
+                ),
+                NSGA2(
+                    pop_size=pop_size,
+                    sampling=self._initial_population(pop_size),
+                    seed=self.options["random_state"],
+                ),
+                ("n_gen", 2 * self.options["n_gen"]),
+                seed=self.options["random_state"],
+                callback=self._generation_callback("final"),
+            )
         return self.result.X, self.result.F
 
+    def _initial_population(self, pop_size):
+        """
+        Returns
+        -------
+        ndarray[pop_size, n_dim]
+            the evaluated non-dominated feasible points, at most pop_size of
+            them, completed by a latin hypercube sampling.
+        """
+        rng = np.random.RandomState(self.options["random_state"])
+        x = self._pareto_set
+        if len(x) > pop_size:
+            x = x[np.sort(rng.choice(len(x), pop_size, replace=False))]
+        if len(x) < pop_size:
+            sampling = LHS(
+                xlimits=self.options["xlimits"], random_state=rng.randint(2 ** 31 - 1)
+            )
+            x = np.vstack([x, sampling(pop_size - len(x))])
+        return x
+
+    def _state(self, k, x, y, y_c, x_data, y_data, y_data_c):
+        """
+        State of the optimization yielded by iterate, given to the callback.
+        """
+        x_data, y_data = np.asarray(x_data), np.asarray(y_data)
+        feasible = np.ones(len(x_data), dtype=bool)
+        if self.n_const > 0:
+            feasible = np.all(np.asarray(y_data_c) <= 0, axis=1)
+        index = np.flatnonzero(feasible)[pareto_index(y_data[feasible])]
+        self._pareto_set, self._pareto_front = x_data[index], y_data[index]
+        state = {
+            "iter": k,
+            "x": x,
+            "y": y,
+            "y_c": y_c,
+            "x_data": x_data,
+            "y_data": y_data,
+            "y_data_c": y_data_c,
+            "pareto_set": x_data[index],
+            "pareto_front": y_data[index],
+            "models": self.modeles,
+            "const_models": self.const_modeles,
+        }
+        if self.options["callback"] is not None:
+            self.options["callback"](state)
+        return state
+
     def _setup_optimizer(self, fun):
         """
         Parameters
@@ -226,15 +531,249 @@ class MOO(SurrogateBasedApplication):
                 random_state=self.options["random_state"],
             )
             xt = sampling(self.options["n_start"])
-        if yt is None:
-            yt = fun(xt)
-        if yc is None and self.n_const > 0:
-            yc = np.array([np.array(con(xt)) for con in self.options["const"]]).T#!!!
+        with self._timer("doe", count=len(xt)):
+            if yt is None:
+                yt = self._evaluator.run(fun, xt)
+            if yc is None and self.n_const > 0:
+                yc = self._eval_const(xt)
         return xt, yt, yc
 
-    def modelize(self, xt, yt, yt_const=None):
+    def _timer(self, name, **info):
+        """
+        Context manager measuring its block as an event of the instrumentation
+        option, doing nothing without instrumentation.
+        """
+        if self.options["instrumentation"] is None:
+            return _NO_TIMER
+        return self.options["instrumentation"].timer(name, **info)
+
+    def _generation_callback(self, phase):
+        """
+        Returns
+        -------
+        function or None
+            pymoo callback measuring each NSGA2 generation as an event of
+            the instrumentation option, None without instrumentation.
+        """
+        instrumentation = self.options["instrumentation"]
+        if instrumentation is None:
+            return None
+        last = [time.perf_counter()]
+
+        def callback(algorithm):
+            now = time.perf_counter()
+            event = {
+                "name": "generation",
+                "time": now - last[0],
+                "count": 1,
+                "wall": time.time(),
+                "phase": phase,
+                "n_gen": algorithm.n_gen,
+                "n_eval": algorithm.evaluator.n_eval,
+            }
+            last[0] = now
+            instrumentation.emit(event)
+
+        return callback
+
+    def _write_checkpoint(self, x, y, y_c):
+        """
+        Appends to the checkpoint file, if any, the new evaluated points,
+        the hyperparameters of the models trained with them, the number of
+        training points and the leave-one-out error of the last trained
+        models kept with retrain_every > 1, and the state of the random
+        generator.
+        """
+        if self.options["checkpoint"] is None:
+            return
+        record = {
+            "x": np.atleast_2d(x),
+            "y": np.atleast_2d(y),
+            "y_c": None if y_c is None else np.atleast_2d(y_c),
+            "theta": self._thetas,
+            "trained": [
+                None if last is None else (last[0].nt, last[1])
+                for last in self._last_trained
+            ],
+            "rng": self.seed.get_state(),
+        }
+        append_record(self.options["checkpoint"], record)
+
+    def _restore_last_trained(self, xt, yt, yt_const, trained, theta):
         """
-        Creates and train a krige model with the given datapoints
+        Rebuilds the last trained models of a checkpoint, see _update_model,
+        from their number of training points and with the hyperparameters
+        of the current models, which are theirs. modelize then adds the next
+        points to them as without interruption.
+
+        Parameters
+        ----------
+        xt, yt, yt_const : ndarray
+            see modelize.
+        trained : list of tuple
+            for each model, its number of training points and its leave-one-out
+            error, or None, as in a checkpoint record.
+        theta : list of ndarray
+            hyperparameters of the models, as in a checkpoint record.
+        """
+        self._last_trained = [
+            None
+            if last is None
+            else (
+                _train(self._new_model(), xt[: last[0]], yt_i[: last[0]], None, theta),
+                last[1],
+            )
+            for yt_i, last, theta in zip(self._tasks(yt, yt_const), trained, theta)
+        ]
+
+    def _eval_const(self, x):
+        """
+        Returns
+        -------
+        ndarray[n_points, n_const]
+            values of the constraints at x, computed by the evaluator.
+        """
+        return np.hstack(
+            [
+                np.reshape(self._evaluator.run(con, x), (len(x), 1))
+                for con in self.options["const"]
+            ]
+        )
+
+    def _optimize_async(self, fun, x_data, y_data, y_data_c, n_evaluated=0):
+        """
+        Asynchronous enrichment, see iterate : batch_size evaluations run
+        in the executor, the points being evaluated are added to the models
+        with virtual outputs, and when an evaluation ends, the models are
+        updated and new points are submitted. n_iter * batch_size points are evaluated,
+        n_evaluated of them being already in the data when resuming.
+        With a process pool, fun and the constraints must be picklable.
+
+        Yields
+        ------
+        dictionnary
+            state of the optimization after each update of the models.
+        """
+        executor = self.options["executor"]
+        n_parallel = self.options["batch_size"]
+        n_eval = self.options["n_iter"] * n_parallel
+        pending = {}  # future : point
+        n_submitted = n_evaluated
+        n_updates = n_evaluated // n_parallel
+        while True:
+            # the models are trained on the evaluated points only here
+            if n_submitted < n_eval and len(pending) < n_parallel:
+                x_virt, y_virt, y_virt_c = x_data, y_data, y_data_c
+                if len(pending) > 0:
+                    x_virt, y_virt, y_virt_c = self._add_virtual_points(
+                        np.array(list(pending.values())), x_virt, y_virt, y_virt_c
+                    )
+                    self.modelize(
+                        x_virt, y_virt, y_virt_c, len(x_virt) - len(x_data)
+                    )
+                while n_submitted < n_eval and len(pending) < n_parallel:
+                    self.log("evaluation " + str(n_submitted + 1) + " submitted")
+                    with self._timer("acquisition", iter=n_updates + 1):
+                        x_et, _ = self._find_best_point(self.options["criterion"])
+                    future = executor.submit(
+                        _evaluate, fun, self.options["const"], np.atleast_2d(x_et)
+                    )
+                    pending[future] = x_et
+                    n_submitted += 1
+                    if n_submitted < n_eval and len(pending) < n_parallel:
+                        x_virt, y_virt, y_virt_c = self._add_virtual_points(
+                            np.atleast_2d(x_et), x_virt, y_virt, y_virt_c
+                        )
+                        self.modelize(
+                            x_virt, y_virt, y_virt_c, len(x_virt) - len(x_data)
+                        )
+            if len(pending) == 0:
+                break
+
+            with self._timer("wait", iter=n_updates + 1):
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            n_old = len(x_data)
+            for future in done:
+                new_x = np.atleast_2d(pending.pop(future))
+                new_y, new_y_c = future.result()
+                x_data = np.atleast_2d(np.append(x_data, new_x, axis=0))
+                y_data = np.atleast_2d(np.append(y_data, new_y, axis=0))
+                if self.n_const > 0:
+                    new_y_c = np.hstack([np.reshape(c, (1, 1)) for c in new_y_c])
+                    y_data_c = np.atleast_2d(np.append(y_data_c, new_y_c, axis=0))
+            self.modelize(x_data, y_data, y_data_c)
+            new_y_c = None if self.n_const == 0 else y_data_c[n_old:]
+            self._write_checkpoint(x_data[n_old:], y_data[n_old:], new_y_c)
+            n_updates += 1
+            yield self._state(
+                n_updates,
+                x_data[n_old:],
+                y_data[n_old:],
+                new_y_c,
+                x_data,
+                y_data,
+                y_data_c,
+            )
+
+    def _add_virtual_points(self, x, x_data, y_data, y_data_c):
+        """
+        Appends the points x, not evaluated yet, to the training data with
+        the virtual outputs of _get_virtual_point and the predicted constraints.
+
+        Returns
+        -------
+        x_data, y_data, y_data_c : ndarray
+            augmented training data.
+        """
+        x_data = np.append(x_data, x, axis=0)
+        y_data = np.append(y_data, self._get_virtual_point(x, y_data), axis=0)
+        if self.n_const > 0:
+            y_c = np.hstack([g.predict_values(x) for g in self.const_modeles])
+            y_data_c = np.append(y_data_c, y_c, axis=0)
+        return x_data, y_data, y_data_c
+
+    def _get_virtual_point(self, x, y_data):
+        """
+        Virtual outputs at x given to the models until x is evaluated,
+        according to the batch_strategy option.
+
+        Parameters
+        ----------
+        x : ndarray[n, n_dim]
+            points not evaluated yet.
+        y_data : ndarray[n_points, ny]
+            current outputs, only used by CLmin.
+
+        Returns
+        -------
+        ndarray[n, ny]
+            virtual outputs.
+        """
+        strategy = self.options["batch_strategy"]
+        if strategy == "CLmin":
+            return np.repeat(np.min(y_data, axis=0, keepdims=True), len(x), axis=0)
+        pred = np.hstack([mod.predict_values(x) for mod in self.modeles])
+        if strategy == "KB":
+            return pred
+        if strategy == "KBUB":
+            conf = 3.0
+        if strategy == "KBLB":
+            conf = -3.0
+        if strategy == "KBRand":
+            conf = self.seed.randn(len(x), self.ny)
+        var = np.hstack([mod.predict_variances(x) for mod in self.modeles])
+        return pred + conf * np.sqrt(var)
+
+    def modelize(self, xt, yt, yt_const=None, n_virtual=0, theta=None):
+        """
+        Creates and train a krige model with the given datapoints.
+        The models are wrapped in Predictor objects sharing their predictions.
+        With n_jobs > 1, they are trained in the process pool of the run,
+        or in a new one out of iterate.
+        With retrain_every > 1, the hyperparameters of the last trained
+        models are kept as long as possible, see _update_model.
+        With multi_output, one model is trained on all the outputs and
+        each output is seen through an OutputView.
 
         Parameters
         ----------
@@ -244,33 +783,145 @@ class MOO(SurrogateBasedApplication):
             Training outputs.
         yt_const : list of ndarray[nt,ny]
             constraints training outputs
+        n_virtual : int, optional
+            number of last points with virtual outputs, not counted in
+            retrain_every, and whose models are not kept. The default is 0.
+        theta : list of ndarray, optional
+            hyperparameters of the models, as in a checkpoint. If given,
+            they are not optimized for the models which are not updated
+            from the last trained ones.
         """
-        self.modeles = []
-        for iny in range(self.ny):
-            t = (
-                KRG(print_global=False)
-                if self.options["surrogate"] == "KRG"
-                else KPLS(print_global=False)
-            )
-            t.set_training_values(xt, yt[:, iny])
-            t.train()
-            self.modeles.append(t)
+        with self._timer("modelize", n_virtual=n_virtual):
+            tasks = self._tasks(yt, yt_const)
+            # models whose hyperparameters are kept, see _update_model
+            models = [
+                self._update_model(i, xt, yt_i, n_virtual)
+                for i, yt_i in enumerate(tasks)
+            ]
+            to_train = [i for i, t in enumerate(models) if t is None]
+            new_models = []
+            for i in to_train:
+                t = self._new_model()
+                if i < len(self._last_trained) and self._last_trained[i] is not None:
+                    t.options["theta0"] = np.clip(
+                        self._last_trained[i][0].optimal_theta,
+                        *t.options["theta_bounds"],
+                    )
+                new_models.append(t)
+            # smt draws the starting hyperparameters with the global numpy generator,
+            # it is seeded for each model so that the result does not depend on n_jobs
+            if self.options["random_state"] is None:
+                seeds = [None] * len(tasks)
+            else:
+                seeds = np.random.SeedSequence(
+                    self.options["random_state"], spawn_key=(len(xt),)
+                ).generate_state(len(tasks))
+            seeds = [seeds[i] for i in to_train]
+            xts = [xt] * len(to_train)
+            yts = [tasks[i] for i in to_train]
+            thetas = [None if theta is None else theta[i] for i in to_train]
+            n_jobs = min(self.options["n_jobs"], len(to_train))
+            with self._timer("training", count=len(to_train), n_virtual=n_virtual):
+                if n_jobs > 1 and getattr(self, "_pool", None) is not None:
+                    new_models = list(
+                        self._pool.map(_train, new_models, xts, yts, seeds, thetas)
+                    )
+                elif n_jobs > 1:
+                    with ProcessPoolExecutor(n_jobs) as pool:
+                        new_models = list(
+                            pool.map(_train, new_models, xts, yts, seeds, thetas)
+                        )
+                else:
+                    new_models = list(map(_train, new_models, xts, yts, seeds, thetas))
+
+            if len(self._last_trained) != len(tasks):
+                self._last_trained = [None] * len(tasks)
+            for i, t in zip(to_train, new_models):
+                models[i] = t
+                if self.options["retrain_every"] > 1 and n_virtual == 0:
+                    loo = loo_error(t) if self.options["loo_tol"] is not None else None
+                    self._last_trained[i] = (t, loo)
 
-        self.const_modeles = []
+            self._thetas = [t.optimal_theta for t in models]
+            models = [
+                Predictor(t, instrumentation=self.options["instrumentation"])
+                for t in models
+            ]
+            if self.options["multi_output"]:
+                models = [OutputView(models[0], j) for j in range(tasks[0].shape[1])]
+            self.modeles = models[: self.ny]
+            self.const_modeles = models[self.ny :]
+
+    def _tasks(self, yt, yt_const=None):
+        """
+        Returns
+        -------
+        list of ndarray
+            training outputs of each model, the objectives and then the
+            constraints, or all of them with multi_output.
+        """
+        tasks = [yt[:, iny] for iny in range(self.ny)]
         if not (yt_const is None):
-            for iny in range(self.n_const):
-                t = (
-                    KRG(print_global=False)
-                    if self.options["surrogate"] == "KRG"
-                    else KPLS(print_global=False)
-                )
-                t.set_training_values(xt, yt_const[:, iny])
-                t.train()
-                self.const_modeles.append(t)
+            tasks += [yt_const[:, iny] for iny in range(self.n_const)]
+        if self.options["multi_output"]:
+            tasks = [np.column_stack(tasks)]
+        return tasks
 
-    def def_prob(self, n_var, xbounds, n_obj, obj, n_const, const):
+    def _new_model(self):
         """
-        Creates the pymoo Problem object with the surrogate as objective
+        Returns
+        -------
+        smt KRG or KPLS
+            untrained model of the surrogate option.
+        """
+        if self.options["surrogate"] == "KRG":
+            return KRG(print_global=False)
+        return KPLS(print_global=False)
+
+    def _update_model(self, i, xt, yt, n_virtual=0):
+        """
+        Parameters
+        ----------
+        i : int
+            index of the model, the objectives and then the constraints.
+        xt, yt : ndarray
+            training points of the model.
+        n_virtual : int, optional
+            see modelize. The default is 0.
+
+        Returns
+        -------
+        smt surrogate model
+            the last trained model i with the new points of xt added without
+            optimizing its hyperparameters, or None if it must be trained :
+            retrain_every points were added since its last training, its
+            training points are not the first points of xt, or its
+            leave-one-out error drifted more than loo_tol.
+        """
+        if i >= len(self._last_trained) or self._last_trained[i] is None:
+            return None
+        model, loo = self._last_trained[i]
+        x_old, y_old = model.training_points[None][0]
+        n_old = len(x_old)
+        if not (
+            n_old < len(xt) < n_old + self.options["retrain_every"] + n_virtual
+            and np.array_equal(xt[:n_old], x_old)
+            and np.array_equal(np.reshape(yt[:n_old], (n_old, -1)), y_old)
+        ):
+            return None
+        model = append_points(model, xt[n_old:], yt[n_old:])
+        if model is None:
+            return None
+        if loo is not None and loo_error(model) > (1 + self.options["loo_tol"]) * loo:
+            self.log("leave-one-out error drift, the hyperparameters are optimized")
+            return None
+        return model
+
+    def def_prob(self, n_var, xbounds, n_obj, obj, n_const, const, vectorized=None):
+        """
+        Creates the pymoo Problem object with the surrogate as objective.
+        With the "vectorized" option, or vectorized = True, the whole population
+        is evaluated at once and obj must then accept x = ndarray[n, n_var].
 
         Returns
         -------
@@ -300,6 +951,28 @@ class MOO(SurrogateBasedApplication):
                         xx = np.asarray(x).reshape(1, -1)
                         out["G"] = [g.predict_values(xx)[0][0] for g in const]
 
+        class MyVectorizedProblem(Problem):
+            def __init__(self):
+                super().__init__(
+                    n_var=n_var,
+                    n_obj=n_obj,
+                    n_constr=n_const,
+                    xl=np.asarray([i[0] for i in xbounds]),
+                    xu=np.asarray([i[1] for i in xbounds]),
+                )
+
+            def _evaluate(self, x, out, *args, **kwargs):
+                if n_obj > 1:
+                    out["F"] = np.hstack([f.predict_values(x) for f in obj])
+                else:  # 1 obj is for acquisition function
+                    out["F"] = np.reshape(obj(x), (-1, 1))
+                if n_const > 0:
+                    out["G"] = np.hstack([g.predict_values(x) for g in const])
+
+        if vectorized is None:
+            vectorized = self.options["vectorized"]
+        if vectorized:
+            return MyVectorizedProblem()
         return MyProblem()
 
     def _find_best_point(self, criter):
@@ -309,8 +982,8 @@ class MOO(SurrogateBasedApplication):
 
         Returns
         -------
-        ndarray
-            next point for the model update.
+        ndarray, float
+            next point for the model update and its criterion value.
         """
         if criter == "GA":
             res = minimize(
@@ -321,11 +994,13 @@ class MOO(SurrogateBasedApplication):
                     obj=self.modeles,
                     n_const=self.n_const,
                     const=self.const_modeles,
+                    vectorized=True,
                 ),
                 NSGA2(
                     pop_size=self.options["pop_size"], seed=self.options["random_state"]
                 ),
                 ("n_gen", self.options["n_gen"]),
+                callback=self._generation_callback("acquisition"),
             )
             X = res.X
             Y = res.F
@@ -336,33 +1011,38 @@ class MOO(SurrogateBasedApplication):
             # MOBOpt criterion
             q = self.options["q"]
             n = ydata.shape[1]
-            d_l_x = [sum([np.linalg.norm(xj - xi) for xj in xdata]) / n for xi in X]
-            d_l_f = [sum([np.linalg.norm(yj - yi) for yj in ydata]) / n for yi in Y]
+            d_l_x = sum_of_distances(X, xdata) / n
+            d_l_f = sum_of_distances(Y, ydata) / n
             µ_x = np.mean(d_l_x)
             µ_f = np.mean(d_l_f)
             var_x, var_f = np.var(d_l_x), np.var(d_l_f)
             if var_x == 0 or var_f == 0:
-                return X[self.seed.randint(len(X)), :]
-            dispersion = [
-                q * (d_l_x[j] - µ_x) / var_x + (1 - q) * (d_l_f[j] - µ_f) / var_f
-                for j in range(X.shape[0])
-            ]
-            i = dispersion.index(max(dispersion))
-            return X[i, :]
+                return X[self.seed.randint(len(X)), :], 0.0
+            dispersion = q * (d_l_x - µ_x) / var_x + (1 - q) * (d_l_f - µ_f) / var_f
+            i = np.argmax(dispersion)
+            return X[i, :], dispersion[i]
 
+        mc = {
+            "points": self.options["mc_points"],
+            "sampling": self.options["mc_sampling"],
+            "tol": self.options["mc_tol"],
+        }
         if criter == "PI":
             PI = Criterion(
                 "PI",
                 self.modeles,
                 random_state=self.options["random_state"],
+                **mc,
             )
             self.obj_k = lambda x: -PI(x)
+            self.crit_k = PI
 
         if criter == "MPI":
             MPI = Criterion(
                 "MPI", self.modeles, random_state=self.options["random_state"]
             )
             self.obj_k = lambda x: -MPI(x)
+            self.crit_k = MPI
 
         if criter == "EHVI":
             ydata = np.transpose(
@@ -376,8 +1056,10 @@ class MOO(SurrogateBasedApplication):
                 ref=ref,
                 hv=hv,
                 random_state=self.options["random_state"],
+                **mc,
             )
             self.obj_k = lambda x: -EHVI(x)
+            self.crit_k = EHVI
 
         if criter == "WB2S":
             xmax, valmax = self._find_best_point(self.options["subcrit"])
@@ -409,6 +1091,7 @@ class MOO(SurrogateBasedApplication):
                 hv=hv,
                 ref=ref,
                 random_state=self.options["random_state"],
+                **mc,
             )
             WB2S = Criterion(
                 "WB2S",
@@ -419,6 +1102,19 @@ class MOO(SurrogateBasedApplication):
                 transfo=self.options["transfo"],
             )
             self.obj_k = lambda x: -WB2S(x)
+            self.crit_k = WB2S
+
+        if self.options["instrumentation"] is not None:
+            self.obj_k = self.options["instrumentation"].timed(
+                self.obj_k, "criterion." + criter
+            )
+
+        if self.options["optimizer"] == "L-BFGS-B":
+            if self.options["penal"] and self.n_const > 0:
+                x_opt = self._multistart(self.penal(self.obj_k))
+            else:
+                x_opt = self._multistart(self.obj_k, self.crit_k, self.const_modeles)
+            return self._log_best_point(criter, x_opt)
 
         if self.options["penal"] and self.n_const > 0:
             prob = self.def_prob(
@@ -445,13 +1141,24 @@ class MOO(SurrogateBasedApplication):
             NSGA2(pop_size=self.options["pop_size"], seed=self.options["random_state"]),
             ("n_gen", self.options["n_gen"]),
             seed=self.options["random_state"],
+            callback=self._generation_callback("acquisition"),
         ).X
         x_opt = (
             maximizers
             if len(maximizers.shape) == 1
             else maximizers[self.seed.randint(len(maximizers))]
         )
-        self.log(criter + " max value : " + str(-self.obj_k(x_opt)))
+        return self._log_best_point(criter, x_opt)
+
+    def _log_best_point(self, criter, x_opt):
+        """
+        Returns
+        -------
+        ndarray, float
+            x_opt and its criterion value.
+        """
+        val_opt = -self.obj_k(x_opt)
+        self.log(criter + " max value : " + str(val_opt))
         self.log("xopt : " + str(x_opt))
         for i in range(self.n_const):
             self.log(
@@ -460,7 +1167,71 @@ class MOO(SurrogateBasedApplication):
                 + " estimated value : "
                 + str(self.const_modeles[i].predict_values(np.array([x_opt]))[0][0])
             )
-        return x_opt, -self.obj_k(x_opt)
+        return x_opt, val_opt
+
+    def _multistart(self, obj, crit=None, const=[]):
+        """
+        Minimizes obj with a multi-start L-BFGS-B (SLSQP with the constraints'
+        models), started from the best points of a latin hypercube pre-screening.
+
+        Parameters
+        ----------
+        obj : function
+            function to minimize, taking one point or a population.
+        crit : Criterion, optional
+            if obj = -crit and crit has an analytic gradient, it is used
+            instead of finite differences.
+        const : list of models, optional
+            constraints' models, g(x) <= 0.
+
+        Returns
+        -------
+        ndarray[n_dim]
+            best local minimum.
+        """
+        xlimits = self.options["xlimits"]
+        sampling = LHS(xlimits=xlimits, random_state=self.seed.randint(2 ** 31 - 1))
+        x_screen = sampling(self.options["pop_size"])
+        values = np.asarray(obj(x_screen), dtype=float)
+        infeasible = np.zeros(len(x_screen), dtype=bool)
+        for g in const:
+            infeasible |= g.predict_values(x_screen)[:, 0] > 0
+        starts = x_screen[np.lexsort((values, infeasible))][: self.options["n_restart"]]
+
+        def fun(x):
+            return float(obj(x))
+
+        jac = None
+        if crit is not None and crit.value_and_gradient(x_screen[:1]) is not None:
+            value_and_gradient = crit.value_and_gradient
+            if self.options["instrumentation"] is not None:
+                value_and_gradient = self.options["instrumentation"].timed(
+                    value_and_gradient, "criterion." + crit.name + ".gradient"
+                )
+
+            def fun(x):
+                val, grad = value_and_gradient(x.reshape(1, -1))
+                return -val[0], -grad[0]
+
+            jac = True
+        kwargs = {"method": "L-BFGS-B"}
+        if len(const) > 0:
+            kwargs = {
+                "method": "SLSQP",
+                "constraints": [
+                    {
+                        "type": "ineq",
+                        "fun": lambda x, g=g: -g.predict_values(x.reshape(1, -1))[0, 0],
+                    }
+                    for g in const
+                ],
+            }
+        best = None
+        for x0 in starts:
+            res = optimize.minimize(fun, x0, jac=jac, bounds=xlimits, **kwargs)
+            if best is None or res.fun < best.fun:
+                best = res
+        return best.x
 
     def penal(self, f):
         """
@@ -505,6 +1276,9 @@ class MOO(SurrogateBasedApplication):
             xdoe=xdoe,
             ydoe=ydoe,
             n_iter=self.options["n_iter"],
+            n_parallel=self.options["batch_size"],
+            qEI=self.options["batch_strategy"],
+            evaluator=self._evaluator,
             criterion="EI",
             n_start=self.options["n_start"],
             xlimits=self.options["xlimits"],
@@ -519,3 +1293,61 @@ class MOO(SurrogateBasedApplication):
             "Optimization done, get the front with .result.F and the set with .result.X"
         )
         return x_opt, y_opt
+
+
+class LazyResult(object):
+    """
+    Pair (X, F) returned by optimize with final_front = "lazy" : X and F are
+    the ones of the .result of the MOO, computed at the first access to one
+    of them, for instance when the pair is unpacked by X, F = mo.optimize(fun).
+    """
+
+    def __init__(self, moo):
+        self._moo = moo
+
+    @property
+    def X(self):
+        return self._moo.result.X
+
+    @property
+    def F(self):
+        return self._moo.result.F
+
+    def __iter__(self):
+        return iter((self.X, self.F))
+
+    def __getitem__(self, i):
+        return (self.X, self.F)[i]
+
+    def __len__(self):
+        return 2
+
+
+_NO_TIMER = nullcontext()
+
+
+def _evaluate(fun, const, x):
+    """
+    Evaluation of fun and of the constraints at x, run by the executor.
+    """
+    return fun(x), [con(x) for con in const]
+
+
+def _train(model, xt, yt, seed=None, theta=None):
+    """
+    Trains model, with the global numpy generator seeded by seed
+    and then restored if seed is given, and with the hyperparameters
+    theta if given. Run by the process pool.
+    """
+    if theta is not None:
+        return train_fixed(model, xt, yt, theta)
+    state = np.random.get_state()
+    if seed is not None:
+        np.random.seed(seed)
+    try:
+        model.set_training_values(xt, yt)
+        model.train()
+    finally:
+        if seed is not None:
+            np.random.set_state(state)
+    return model
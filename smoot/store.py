@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only store of result arrays, read lazily through memory mapping.
+"""
+
+import json
+import os
+import pickle
+
+import numpy as np
+
+
+class ResultsStore(object):
+    """
+    Directory where arrays are appended to the binary file "data.bin",
+    each one being described by a json line of "index.jsonl" : its key,
+    a list of str and int such as ["run0", "F"], its offset in the data
+    file, its dtype and its shape. The parameters of the runs, a dictionnary,
+    are pickled in "param.pkl". A key appended again replaces the former array.
+    An array whose index line was not written, because of an interruption,
+    is ignored, and a truncated last line is removed from the index when the
+    store is opened, so that the new lines are appended after the last
+    complete one.
+    """
+
+    _DATA = "data.bin"
+    _INDEX = "index.jsonl"
+    _PARAM = "param.pkl"
+    _ALIGN = 64  # bytes, so that the arrays can be viewed in the mapping
+
+    def __init__(self, path, mode="a"):
+        """
+        Parameters
+        ----------
+        path : str
+            directory of the store, created if needed.
+        mode : str, optional
+            "a" to append to the existing store, "w" to replace it, as well
+            as any file at path. The default is "a".
+        """
+        self.path = path
+        if mode == "w":
+            if os.path.isfile(path):
+                os.remove(path)
+            for name in [self._DATA, self._INDEX, self._PARAM]:
+                if os.path.isfile(os.path.join(path, name)):
+                    os.remove(os.path.join(path, name))
+        os.makedirs(path, exist_ok=True)
+        self._records = {}
+        index = os.path.join(path, self._INDEX)
+        if os.path.isfile(index):
+            end = 0  # end of the last complete line
+            with open(index, "rb") as fichier:
+                for line in fichier:
+                    if not line.endswith(b"\n"):  # truncated last line
+                        break
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        break
+                    self._records[tuple(rec["key"])] = rec
+                    end += len(line)
+            if end < os.path.getsize(index):
+                with open(index, "r+b") as fichier:
+                    fichier.truncate(end)
+        self._data = None
+
+    def append(self, key, value):
+        """
+        Parameters
+        ----------
+        key : tuple of str and int
+            key of the array.
+        value : array-like
+            array of numbers, strings or booleans, not of objects.
+        """
+        value = np.ascontiguousarray(value)
+        if value.dtype.hasobject:
+            raise TypeError("only arrays without objects can be stored")
+        with open(os.path.join(self.path, self._DATA), "ab") as fichier:
+            offset = fichier.tell()
+            padding = -offset % self._ALIGN
+            fichier.write(b"\0" * padding)
+            fichier.write(value.tobytes())
+            fichier.flush()
+            os.fsync(fichier.fileno())
+        rec = {
+            "key": list(key),
+            "offset": offset + padding,
+            "dtype": value.dtype.str,
+            "shape": list(value.shape),
+        }
+        with open(os.path.join(self.path, self._INDEX), "a") as fichier:
+            fichier.write(json.dumps(rec) + "\n")
+            fichier.flush()
+            os.fsync(fichier.fileno())
+        self._records[tuple(key)] = rec
+        self._data = None  # the mapping does not contain the new array
+
+    def __getitem__(self, key):
+        """
+        Returns
+        -------
+        ndarray
+            read-only view of the array in the memory mapping of the data
+            file, read from the disk only when used.
+        """
+        rec = self._records[tuple(key)]
+        dtype = np.dtype(rec["dtype"])
+        shape = tuple(rec["shape"])
+        size = int(np.prod(shape)) * dtype.itemsize
+        if size == 0:
+            return np.zeros(shape, dtype=dtype)
+        if self._data is None:
+            self._data = np.memmap(
+                os.path.join(self.path, self._DATA), dtype=np.uint8, mode="r"
+            )
+        offset = rec["offset"]
+        return self._data[offset : offset + size].view(dtype).reshape(shape)
+
+    def __contains__(self, key):
+        return tuple(key) in self._records
+
+    def __len__(self):
+        return len(self._records)
+
+    def keys(self):
+        """
+        Returns
+        -------
+        list of tuple
+            keys of the stored arrays, in their order of writing.
+        """
+        return list(self._records)
+
+    @property
+    def param(self):
+        """
+        Parameters of the runs, None if they were not given.
+        """
+        path = os.path.join(self.path, self._PARAM)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "rb") as fichier:
+            return pickle.load(fichier)
+
+    @param.setter
+    def param(self, param):
+        """
+        The values which cannot be pickled, such as lambdas, are replaced
+        by their repr.
+        """
+        param = dict(param)
+        for clef, val in param.items():
+            try:
+                pickle.dumps(val)
+            except Exception:
+                param[clef] = repr(val)
+        with open(os.path.join(self.path, self._PARAM), "wb") as fichier:
+            pickle.dump(param, fichier)
+
+    def tree(self, lazy=True):
+        """
+        Parameters
+        ----------
+        lazy : bool, optional
+            True for views in the memory mapping, False to load the arrays
+            in memory. The default is True.
+
+        Returns
+        -------
+        dictionnary
+            nested dictionnaries of the arrays, following their keys, the
+            levels whose keys are the int 0, 1, ... n-1 being lists.
+        """
+        tree = {}
+        for key in self._records:
+            node = tree
+            for k in key[:-1]:
+                node = node.setdefault(k, {})
+            node[key[-1]] = self[key] if lazy else np.array(self[key])
+        return _to_lists(tree)
+
+
+def _to_lists(node):
+    """
+    Converts the dictionnaries of the tree with keys 0, 1, ... n-1 to lists
+    """
+    if not isinstance(node, dict):
+        return node
+    node = {k: _to_lists(v) for k, v in node.items()}
+    if all(type(k) == int for k in node) and sorted(node) == list(range(len(node))):
+        return [node[k] for k in range(len(node))]
+    return node
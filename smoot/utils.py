@@ -7,12 +7,17 @@ Created on Mon May 31 09:35:47 2021
 
 from smoot import MOO
 from smoot import ZDT
+from smoot.cache import CachedFunction
+from smoot.store import ResultsStore
 
 import ast
 import matplotlib.pyplot as plt
+import multiprocessing
 import numpy as np
+import os
 import pickle
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from smt.sampling_methods import LHS
 from pymoo.factory import get_performance_indicator
 
@@ -38,9 +43,14 @@ def write_increase_iter(
         lambda l: sum(l),
     ],
     titles=None,
+    cache=None,
+    n_jobs=1,
 ):
     """
-    write a dictionnary with the results of the runs for each criterion in path.
+    write the results of the runs for each criterion in the ResultsStore path,
+    read by read_results : results[title]["fronts"][run][iteration],
+    results[title]["dists"][run] and results[title]["time"][run], the run
+    number run being the one of the seed start_seed + run.
 
     Parameters
     ----------
@@ -64,7 +74,24 @@ def write_increase_iter(
         Subcriterions for wb2S
     transfos : list of function
         Transformations for wb2S
+    cache : str, optional
+        if given, file where the values of fun are stored by a CachedFunction,
+        so that a point is evaluated only once for all the runs, and for the
+        next calls with the same file. The default is None.
+    n_jobs : int, optional
+        number of processes running the (criterion, seed) jobs, with the fork
+        start method so that fun and the transfos do not need to be picklable.
+        Where fork is not available (Windows), the jobs are run one after
+        the other. The default is 1.
+
+    The results of each job are appended to the store as soon as it is
+    finished, its time last, so that an interrupted call resumes with the
+    same path by skipping the jobs whose time is in the store. Hence, a path
+    already holding all the results is left as it is : remove it to run the
+    jobs again.
     """
+    if cache is not None:
+        fun = CachedFunction(fun, cache)
     if xlimits is None:
         xlimits = fun.xlimits
     if reference is None and indic != "hv":
@@ -75,7 +102,6 @@ def write_increase_iter(
         igd = get_performance_indicator(indic, reference)
     if titles is None:
         titles = criterions
-    fichier = open(path, "wb")
     mo = MOO(xlimits=xlimits)
     for clef, val in paraMOO.items():
         mo.options._dict[clef] = val
@@ -94,21 +120,18 @@ def write_increase_iter(
         mo.options["criterion"] = criterion
         mo.options["random_state"] = seed
         mo.options["xdoe"] = xdoe
-        mo.options["n_iter"] = 0
+        mo.options["n_iter"] = n - 1
         mo.options["subcrit"] = subcrit
         mo.options["transfo"] = transfo
-        mo.optimize(fun)
-        fronts.append(mo.result.F)
-        mo.options["n_iter"] = 1
-        for i in range(1, n):
+        # one run, the front of the models being computed after each iteration
+        stime = time.time()
+        for state in mo.iterate(fun):
+            if state["iter"] > 0:
+                times.append(time.time() - stime)
+            X, F = mo.compute_result()
+            fronts.append(F if state["iter"] == 0 else fun(X))
+            xdoe = state["x_data"]
             stime = time.time()
-            mo.options[
-                "xdoe"
-            ] = xdoe  # the last doe is used for the new iteration to add a point
-            X, _ = mo.optimize(fun)
-            fronts.append(fun(X))
-            times.append(time.time() - stime)
-            xdoe = mo.modeles[0].training_points[None][0][0]
         dists = [igd.calc(fr) for fr in fronts]  # - to have the growth as goal
 
         if verbose:
@@ -116,37 +139,74 @@ def write_increase_iter(
             # print("distances",dists)
         return dists, fronts, times
 
-    dico_res = {crit: {} for crit in titles}
-    # plots_moy = []
-    for i, crit in enumerate(criterions):
-        fronts_pareto = []
-        distances = []
-        temps = []
+    def run_job(i, graine):
+        """
+        Run of the criterion i with the seed graine, as a record for the store
+        """
         if verbose:
-            print("criterion ", titles[i])
-        for graine in range(start_seed, start_seed + runs):
-            if verbose:
-                print("seed", graine)
-            di, fr, tmps = obj_profile(
-                crit, n=n_max, seed=graine, subcrit=subcrits[i], transfo=transfos[i]
-            )
-            fronts_pareto.append(fr)
-            distances.append(di)
-            temps.append(tmps)
-        dico_res[titles[i]] = {
-            "time": temps.copy(),
-            "fronts": fronts_pareto.copy(),
-            "dists": distances.copy(),
+            print("criterion ", titles[i], "seed", graine)
+        di, fr, tmps = obj_profile(
+            criterions[i],
+            n=n_max,
+            seed=graine,
+            subcrit=subcrits[i],
+            transfo=transfos[i],
+        )
+        return {
+            "title": titles[i],
+            "seed": graine,
+            "dists": di,
+            "fronts": fr,
+            "time": tmps,
         }
-    pickle.dump(dico_res, fichier)
-    fichier.close()
+
+    # a file at path is a pickle of the former versions, replaced
+    store = ResultsStore(path, mode="w" if os.path.isfile(path) else "a")
+
+    def write(rec):
+        run = rec["seed"] - start_seed
+        for it, front in enumerate(rec["fronts"]):
+            store.append((rec["title"], "fronts", run, it), front)
+        store.append((rec["title"], "dists", run), rec["dists"])
+        store.append((rec["title"], "time", run), rec["time"])  # job finished
+
+    todo = [
+        (i, graine)
+        for i in range(len(criterions))
+        for graine in range(start_seed, start_seed + runs)
+        if (titles[i], "time", graine - start_seed) not in store
+    ]
+    fork = "fork" in multiprocessing.get_all_start_methods()
+    if n_jobs > 1 and len(todo) > 1 and fork:
+        _JOBS["run"] = run_job  # inherited by the forked processes
+        context = multiprocessing.get_context("fork")
+        try:
+            with ProcessPoolExecutor(n_jobs, mp_context=context) as pool:
+                futures = [pool.submit(_run_job, i, graine) for i, graine in todo]
+                for future in as_completed(futures):
+                    write(future.result())  # only the parent writes the store
+        finally:
+            _JOBS.pop("run", None)  # not keeping fun and the MOO
+    else:
+        for i, graine in todo:
+            write(run_job(i, graine))
+
+
+_JOBS = {}
+
+
+def _run_job(i, graine):
+    """
+    Job of write_increase_iter run by a forked process
+    """
+    return _JOBS["run"](i, graine)
 
 
 def write_results(fun, path, runs=1, paraMOO={}):
     """
     Run runs times the optimizer on fun using the paraMOO parameters.
-    The results of each run are stored in path using the pickle module.
-    To get the datas for postprocessing, use read_results(path).
+    The results of each run are appended to the ResultsStore path as soon as
+    the run ends. To get the datas for postprocessing, use read_results(path).
 
     Parameters
     ----------
@@ -159,39 +219,43 @@ def write_results(fun, path, runs=1, paraMOO={}):
     paraMOO : dictionnary, optional
         parameters for MOO solver. The default is {}.
     """
-    fichier = open(path, "wb")
+    store = ResultsStore(path, mode="w")
     mo = MOO()
     for clef, val in paraMOO.items():
         mo.options._dict[clef] = val
-    pickle.dump(mo.options._dict, fichier)
-    dico_res = {}
+    store.param = mo.options._dict
     for i in range(runs):
         titre = "run" + str(i)
-        dico_res[titre] = {}
         mo.optimize(fun)
-        dico_res[titre]["F"] = mo.result.F
-        dico_res[titre]["X"] = mo.result.X
-    pickle.dump(dico_res, fichier)
-    fichier.close()
+        store.append((titre, "F"), mo.result.F)
+        store.append((titre, "X"), mo.result.X)
 
 
-def read_results(path):
+def read_results(path, lazy=True):
     """
-    read the results written thanks to write_results in path
+    read the results written thanks to write_results or write_increase_iter
+    in path, or in the pickle file of the former versions of write_results
 
     Parameters
     ----------
     path : string
         Absolute path.
+    lazy : bool, optional
+        True to get the arrays of a ResultsStore as views of its memory
+        mapping, read from the disk only when used. The default is True.
 
     Returns
     -------
     param : dictionnary
-        dictionnary of the given parameters for the runs
+        dictionnary of the given parameters for the runs,
+        None for write_increase_iter
     results : dictionnary
         contains the datas relatives to the runs. For instance,
         results["run0"]["F"] contains the pareto front of the first run.
     """
+    if os.path.isdir(path):
+        store = ResultsStore(path)
+        return store.param, store.tree(lazy)
     fichier = open(path, "rb")
     param = pickle.load(fichier)
     results = pickle.load(fichier)
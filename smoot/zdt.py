@@ -53,36 +53,25 @@ class ZDT(Problem):
             f1[:, 0] = 1 - np.exp(-4 * x[:, 0]) * np.sin(6 * np.pi * x[:, 0]) ** 6
 
         # g
-        g = np.zeros((ne, 1))
+        z = x[:, j:nx]
         if self.options["type"] < 4:
-            for i in range(ne):
-                g[i, 0] = 1 + 9 / (nx - j) * sum(x[i, j:nx])
+            g = 1 + 9 / (nx - j) * np.sum(z, axis=1, keepdims=True)
         elif self.options["type"] == 4:
-            for i in range(ne):
-                g[i, 0] = (
-                    1
-                    + 10 * (nx - j)
-                    + sum(x[i, j:nx] ** 2 - 10 * np.cos(4 * np.pi * x[i, j + 1 : nx]))
-                )
+            g = (
+                1
+                + 10 * (nx - j)
+                + np.sum(z ** 2 - 10 * np.cos(4 * np.pi * z), axis=1, keepdims=True)
+            )
         else:
-            for i in range(ne):
-                g[i, 0] = 1 + 9 * (sum(x[i, j:nx]) / (nx - j)) ** 0.25
+            g = 1 + 9 * (np.sum(z, axis=1, keepdims=True) / (nx - j)) ** 0.25
 
         # h
-        h = np.zeros((ne, 1))
         if self.options["type"] == 1 or self.options["type"] == 4:
-            for i in range(ne):
-                h[i, 0] = 1 - np.sqrt(f1[i, 0] / g[i, 0])
+            h = 1 - np.sqrt(f1 / g)
         elif self.options["type"] == 2 or self.options["type"] == 5:
-            for i in range(ne):
-                h[i, 0] = 1 - (f1[i, 0] / g[i, 0]) ** 2
+            h = 1 - (f1 / g) ** 2
         else:
-            for i in range(ne):
-                h[i, 0] = (
-                    1
-                    - np.sqrt(f1[i, 0] / g[i, 0])
-                    - f1[i, 0] / g[i, 0] * np.sin(10 * np.pi * f1[i, 0])
-                )
+            h = 1 - np.sqrt(f1 / g) - f1 / g * np.sin(10 * np.pi * f1)
 
         return np.hstack((f1, g * h))
 
@@ -116,16 +105,11 @@ class ZDT(Problem):
             b2 = b1 + F[1][1] - F[1][0]
             b3 = b2 + F[2][1] - F[2][0]
             b4 = b3 + F[3][1] - F[3][0]  # sum([inter[1]-inter[0] for inter in F ])
-            for i in range(npoints):
-                pt = rand.uniform(0, b4)
-                if pt > b3:
-                    X[i, 0] = F[3][0] + pt - b3
-                elif pt > b2:
-                    X[i, 0] = F[2][0] + pt - b2
-                elif pt > b1:
-                    X[i, 0] = F[1][0] + pt - b1
-                else:
-                    X[i, 0] = pt
+            pt = rand.uniform(0, b4, npoints)
+            # interval of each point, a point on a bound being in the lower one
+            k = np.searchsorted([b1, b2, b3], pt, side="left")
+            starts = np.array([0, F[1][0], F[2][0], F[3][0]])
+            X[:, 0] = starts[k] + pt - np.array([0, b1, b2, b3])[k]
         else:
             X[:, 0] = rand.uniform(0, 1, npoints)
         return X, self._evaluate(X)
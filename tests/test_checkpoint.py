@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+A run resumed from its checkpoint evaluates the same points as the
+uninterrupted run, the models being retrained at the same updates.
+"""
+
+import warnings
+
+import numpy as np
+import pytest
+
+from smoot import MOO, ZDT, Instrumentation
+
+
+def run(path, retrain_every, stop=None):
+    instrumentation = Instrumentation()
+    mo = MOO(
+        n_iter=6,
+        criterion="PI",
+        random_state=1,
+        pop_size=20,
+        n_gen=10,
+        n_start=8,
+        xlimits=ZDT(ndim=2).xlimits,
+        retrain_every=retrain_every,
+        checkpoint=path,
+        instrumentation=instrumentation,
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for state in mo.iterate(ZDT(ndim=2)):
+            if state["iter"] == stop:
+                break
+    trainings = [
+        event["count"]
+        for event in instrumentation.events
+        if event["name"] == "training"
+    ]
+    return state["x_data"], trainings
+
+
+@pytest.mark.parametrize("retrain_every", [1, 3])
+def test_resume(tmp_path, retrain_every):
+    x_ref, trained_ref = run(str(tmp_path / "ref.pkl"), retrain_every)
+    run(str(tmp_path / "ck.pkl"), retrain_every, stop=4)
+    x, trained = run(str(tmp_path / "ck.pkl"), retrain_every)
+    np.testing.assert_array_equal(x, x_ref)
+    # the first modelize of the resumed run only rebuilds the models
+    assert trained[1:] == trained_ref[5:]
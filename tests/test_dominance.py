@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+The vectorized dominance functions give the same results as the former
+double loop of Criterion.pareto and Criterion.dominate_min.
+"""
+
+import numpy as np
+import pytest
+
+from smoot.criterion import Criterion
+from smoot.dominance import is_dominated, non_dominated_sort, pareto_index
+
+
+def legacy_pareto(Y):
+    """
+    Criterion.pareto before its vectorization
+    """
+    index = []
+    n = len(Y)
+    dominated = [False] * n
+    for y in range(n):
+        if not dominated[y]:
+            for y2 in range(y + 1, n):
+                if not dominated[y2]:
+                    y_domine_y2, y2_domine_y = Criterion.dominate_min(Y[y], Y[y2])
+                    if y_domine_y2:
+                        dominated[y2] = True
+                    if y2_domine_y:
+                        dominated[y] = True
+                        break
+            if not dominated[y]:
+                index.append(y)
+    return index
+
+
+def legacy_is_dominated(y, pf):
+    return any(Criterion.dominate_min(p, y)[0] for p in pf)
+
+
+def legacy_sort(Y):
+    remaining = list(range(len(Y)))
+    fronts = []
+    while remaining:
+        front = [remaining[i] for i in legacy_pareto([Y[j] for j in remaining])]
+        fronts.append(front)
+        remaining = [i for i in remaining if i not in front]
+    return fronts
+
+
+def random_sets():
+    """
+    Sets of 1 to 5 objectives, with few distinct values so that there are
+    ties, and with duplicated points.
+    """
+    rng = np.random.RandomState(0)
+    for n_obj in range(1, 6):
+        for _ in range(20):
+            n = rng.randint(1, 40)
+            Y = rng.randint(0, 4, (n, n_obj)).astype(float)
+            Y = np.vstack([Y, Y[rng.randint(0, n, rng.randint(0, 5))]])
+            yield Y[rng.permutation(len(Y))]
+        yield rng.rand(60, n_obj)
+
+
+@pytest.mark.parametrize("Y", list(random_sets()))
+def test_pareto_index(Y):
+    assert list(pareto_index(Y)) == legacy_pareto(Y)
+
+
+@pytest.mark.parametrize("Y", list(random_sets()))
+def test_is_dominated(Y):
+    pf = Y[pareto_index(Y)]
+    expected = [legacy_is_dominated(y, pf) for y in Y]
+    assert list(is_dominated(Y, pf)) == expected
+    expected = [legacy_is_dominated(y, Y[: len(Y) // 2]) for y in Y]
+    assert list(is_dominated(Y, Y[: len(Y) // 2])) == expected
+
+
+@pytest.mark.parametrize("Y", list(random_sets()))
+def test_non_dominated_sort(Y):
+    fronts = non_dominated_sort(Y, block_size=7)
+    assert [list(front) for front in fronts] == legacy_sort(Y)
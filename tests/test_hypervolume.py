@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+The merged decomposition of the dominated region gives disjoint boxes whose
+volumes sum to the hypervolume, and the improvements computed point by point
+are the ones computed on the boxes.
+"""
+
+import numpy as np
+import pytest
+
+from smoot.dominance import pareto_index
+from smoot.hypervolume import (
+    dominated_boxes,
+    hypervolume_improvement,
+    hypervolume_improvement_front,
+)
+
+
+def legacy_hypervolume(front, ref):
+    """
+    Hypervolume by inclusion-exclusion, for small fronts
+    """
+    hv = 0
+    n = len(front)
+    for subset in range(1, 2 ** n):
+        index = [i for i in range(n) if subset >> i & 1]
+        corner = np.max(front[index], axis=0)
+        hv += (-1) ** (len(index) + 1) * np.prod(np.maximum(ref - corner, 0))
+    return hv
+
+
+def random_fronts():
+    rng = np.random.RandomState(0)
+    for n_obj in range(2, 7):
+        for _ in range(5):
+            n = rng.randint(1, 12)
+            Y = rng.randint(0, 4, (n, n_obj)).astype(float)
+            yield Y, np.full(n_obj, 3.5)
+        Y = np.abs(rng.normal(size=(12, n_obj)))
+        yield Y / np.linalg.norm(Y, axis=1, keepdims=True), np.full(n_obj, 1.1)
+
+
+@pytest.mark.parametrize("Y, ref", list(random_fronts()))
+def test_dominated_boxes(Y, ref):
+    lower, upper = dominated_boxes(Y, ref)
+    assert np.all(upper > lower)
+    front = Y[pareto_index(Y)]
+    front = front[np.all(front < ref, axis=1)]
+    hv = legacy_hypervolume(front, ref) if len(front) > 0 else 0
+    np.testing.assert_allclose(np.prod(upper - lower, axis=1).sum(), hv, atol=1e-12)
+    # disjoint boxes, all in the dominated region
+    X = np.random.RandomState(1).rand(2000, len(ref)) * ref
+    inside = np.all((X[:, None] >= lower) & (X[:, None] < upper), axis=2)
+    assert inside.sum(axis=1).max() <= 1
+    covered = X[inside.any(axis=1), None, :]
+    assert np.all(np.any(np.all(Y <= covered, axis=2), axis=1))
+
+
+@pytest.mark.parametrize("max_boxes", [None, 1, 5])
+@pytest.mark.parametrize("Y, ref", list(random_fronts()))
+def test_hypervolume_improvement(Y, ref, max_boxes):
+    front = Y[pareto_index(Y)]
+    X = np.random.RandomState(2).rand(100, len(ref)) * ref
+    np.testing.assert_allclose(
+        hypervolume_improvement_front(X, front, ref, max_boxes),
+        hypervolume_improvement(X, *dominated_boxes(front, ref), ref),
+        atol=1e-12,
+    )
+
+
+def test_max_boxes():
+    Y = np.abs(np.random.RandomState(3).normal(size=(30, 5)))
+    Y = Y / np.linalg.norm(Y, axis=1, keepdims=True)
+    lower, _ = dominated_boxes(Y, np.full(5, 1.1))
+    assert dominated_boxes(Y, np.full(5, 1.1), len(lower)) is not None
+    assert dominated_boxes(Y, np.full(5, 1.1), len(lower) - 1) is None
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Exporting the events several times writes each of them once.
+"""
+
+import json
+
+from smoot.instrumentation import Instrumentation
+
+
+def read_names(path):
+    with open(path) as fichier:
+        return [json.loads(line)["name"] for line in fichier]
+
+
+def test_export_twice(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    instrumentation = Instrumentation()
+    instrumentation.count("evaluation", 3)
+    with instrumentation.timer("modelize"):
+        pass
+    instrumentation.export(path)
+    instrumentation.count("prediction", 10)
+    instrumentation.export(path)
+    instrumentation.export(path)
+    assert read_names(path) == ["evaluation", "modelize", "prediction"]
+
+    instrumentation.reset()
+    instrumentation.count("final")
+    instrumentation.export(path)
+    assert read_names(path) == ["evaluation", "modelize", "prediction", "final"]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+A ResultsStore whose index was truncated by an interruption keeps its
+complete lines and records the arrays appended after it.
+"""
+
+import os
+
+import numpy as np
+
+from smoot.store import ResultsStore
+
+
+def test_torn_index(tmp_path):
+    path = str(tmp_path / "store")
+    store = ResultsStore(path, mode="w")
+    store.append(("a", 0), np.arange(3))
+    store.append(("a", 1), np.arange(4))
+    index = os.path.join(path, ResultsStore._INDEX)
+    with open(index, "r+b") as fichier:
+        fichier.truncate(os.path.getsize(index) - 5)
+
+    store = ResultsStore(path)
+    assert store.keys() == [("a", 0)]
+    store.append(("a", 1), np.arange(5))
+    store.append(("b", 0), np.ones(2))
+
+    store = ResultsStore(path)
+    assert store.keys() == [("a", 0), ("a", 1), ("b", 0)]
+    np.testing.assert_array_equal(store["a", 0], np.arange(3))
+    np.testing.assert_array_equal(store["a", 1], np.arange(5))
+    np.testing.assert_array_equal(store["b", 0], np.ones(2))
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+The vectorized ZDT problems give the same results as the former row by row
+evaluation and sampling.
+"""
+
+import numpy as np
+import pytest
+
+from smoot.zdt import ZDT
+
+
+def reference(x, typ):
+    """
+    Row by row evaluation of the former ZDT._evaluate, for types 1, 2, 3, 5
+    """
+    ne, nx = x.shape
+    j = min(1, nx - 1)
+    y = np.zeros((ne, 2))
+    for i in range(ne):
+        if typ < 5:
+            f1 = x[i, 0]
+        else:
+            f1 = 1 - np.exp(-4 * x[i, 0]) * np.sin(6 * np.pi * x[i, 0]) ** 6
+        if typ < 4:
+            g = 1 + 9 / (nx - j) * sum(x[i, j:nx])
+        else:
+            g = 1 + 9 * (sum(x[i, j:nx]) / (nx - j)) ** 0.25
+        if typ == 1:
+            h = 1 - np.sqrt(f1 / g)
+        elif typ in [2, 5]:
+            h = 1 - (f1 / g) ** 2
+        else:
+            h = 1 - np.sqrt(f1 / g) - f1 / g * np.sin(10 * np.pi * f1)
+        y[i] = [f1, g * h]
+    return y
+
+
+def reference_pareto_3(npoints, random_state):
+    """
+    Former point by point sampling of the Pareto set of ZDT3
+    """
+    rand = np.random.RandomState(random_state)
+    F = [
+        [0, 0.0830015349],
+        [0.4093136748, 0.4538821041],
+        [0.6183967944, 0.6525117038],
+        [0.8233317983, 0.8518328654],
+    ]
+    b1 = F[0][1]
+    b2 = b1 + F[1][1] - F[1][0]
+    b3 = b2 + F[2][1] - F[2][0]
+    b4 = b3 + F[3][1] - F[3][0]
+    x = np.zeros(npoints)
+    for i in range(npoints):
+        pt = rand.uniform(0, b4)
+        if pt > b3:
+            x[i] = F[3][0] + pt - b3
+        elif pt > b2:
+            x[i] = F[2][0] + pt - b2
+        elif pt > b1:
+            x[i] = F[1][0] + pt - b1
+        else:
+            x[i] = pt
+    return x
+
+
+@pytest.mark.parametrize("typ", [1, 2, 3, 5])
+@pytest.mark.parametrize("ndim", [1, 2, 3, 5, 30])
+def test_evaluate(typ, ndim):
+    x = np.random.RandomState(ndim).rand(100, ndim)
+    np.testing.assert_allclose(
+        ZDT(type=typ, ndim=ndim)(x), reference(x, typ), rtol=1e-12, atol=1e-12
+    )
+
+
+@pytest.mark.parametrize("ndim", [2, 5])
+def test_pareto_3(ndim):
+    X, Y = ZDT(type=3, ndim=ndim).pareto(500, random_state=3)
+    np.testing.assert_array_equal(X[:, 0], reference_pareto_3(500, 3))
+    np.testing.assert_array_equal(X[:, 1:], 0)
+    np.testing.assert_allclose(Y, reference(X, 3), rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize("ndim", [2, 3, 4, 10])
+def test_pareto_4(ndim):
+    X, Y = ZDT(type=4, ndim=ndim).pareto(200, random_state=0)
+    # g = 1 on the Pareto set : f2 = 1 - sqrt(f1)
+    np.testing.assert_allclose(Y[:, 1], 1 - np.sqrt(X[:, 0]), rtol=1e-12, atol=1e-12)
+    # and g > 1 elsewhere, f2 being then above the front
+    x = np.random.RandomState(0).rand(200, ndim)
+    y = ZDT(type=4, ndim=ndim)(x)
+    assert np.all(y[:, 1] > 1 - np.sqrt(x[:, 0]))